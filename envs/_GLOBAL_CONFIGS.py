@@ -8,6 +8,7 @@ ROOT_PATH = ROOT_PATH[:ROOT_PATH.rfind('/')+1]
 ASSETS_PATH = os.path.join(ROOT_PATH, 'assets/')
 EMBODIMENTS_PATH = os.path.join(ASSETS_PATH, 'embodiments/')
 CONFIGS_PATH = os.path.join(ROOT_PATH, 'task_config/')
+CACHE_PATH = os.path.join(ROOT_PATH, '.cache/')
 
 
 # 世界坐标euler角
@@ -6,23 +6,29 @@ import pdb
 import numpy as np
 import toppra as ta
 import json
+import pickle
 import transforms3d as t3d
 from collections import OrderedDict
 
 from .utils import *
 import math
 from .robot import Robot
+from .robot.plan_pool import get_plan_pool, can_start_workers
 from .camera import Camera
 import random
 from copy import deepcopy
 import subprocess
 from pathlib import Path
-import trimesh
+trimesh = lazy_import('trimesh')
 
 current_file_path = os.path.abspath(__file__)
 parent_directory = os.path.dirname(current_file_path)
 
 TACTILE_ON = os.environ.get('VISION_TACTILE_ON', '0') == '1'
+# a speculative plan is committed if the arm ends its move within this distance (rad) of the predicted end qpos
+SPECULATIVE_QPOS_TOL = 0.01
+# the gap between the actual and the predicted start of a committed plan is closed over this many steps
+SPECULATIVE_BLEND_STEPS = 50
 if TACTILE_ON:
     import warp as wp
     from .camera.vision_tactile_sensor import VisionTactileSensors
@@ -68,11 +74,19 @@ class Base_task(gym.Env):
             - `self.ep_num`: Episode ID.
             - `self.task_name`: Task name.
             - `self.save_dir`: Save path.`
+            - `self.save_format`: "pkl" for one pickle per frame, "zarr" for one chunked store per episode.
+            - `self.saver`: Background writer used when `async_save` is on, kept across episodes.
             - `self.left_original_pose`: Left arm original pose.
             - `self.right_original_pose`: Right arm original pose.
             - `self.left_arm_joint_id`: [6,14,18,22,26,30].
             - `self.right_arm_joint_id`: [7,15,19,23,27,31].
             - `self.render_fre`: Render frequency.
+            - `self.screen_mode`: Physics-only seed screening, no cameras, viewer or ray tracing.
+            - `self.render_profile`: Render quality profile of `_render_config.yml` (fast / rt_preview / rt_final).
+            - `self.scene_reused`: The static world (engine, scene, table, robot, planners, cameras) of the previous
+              episode is kept and only reset, see `reset_scene`.
+            - `self.traj_cache`: Planner results of the seed, recorded on the seed pass and replayed on the collection pass.
+            - `self.record_state`: Keep the scene and robot state of every saved frame for `replay_render`.
         '''
         super().__init__()
         ta.setup_logging("CRITICAL") # hide logging
@@ -86,15 +100,62 @@ class Base_task(gym.Env):
         self.random_texture = kwags.get('random_texture', False)
         self.data_type = kwags.get('data_type', None)
         self.is_save = kwags.get('is_save', False)
+        self.save_format = kwags.get('save_format', 'pkl')
+        self.save_chunk_frames = kwags.get('save_chunk_frames', None)
+        self.episode_writer = None
+        self.video_writers = {}
+        self.save_fsync = kwags.get('save_fsync', False)
+        if kwags.get('async_save', False) and self.is_save:
+            if getattr(self, 'saver', None) is None:
+                self.saver = AsyncSaver(kwags.get('save_queue_size', 32))
+            self.saver.reset_stats()
         self.dual_arm = kwags.get('dual_arm', True)
         self.table_static = kwags.get('table_static', True)
         self.messy_table = kwags.get('messy_table', False)
+        # tactile sensors are rendered, screening is not supported with them
+        self.screen_mode = kwags.get('screen_mode', False) and not TACTILE_ON
+        if self.screen_mode:
+            self.render_freq = 0
+            self.is_save = False
+        # tactile sensors are simulated by the ipc system, their state is not part of the recorded frames
+        if TACTILE_ON and (kwags.get('record_state', False) or kwags.get('replay_state')):
+            raise ValueError('record_state and replay_state are not supported with tactile sensors (VISION_TACTILE_ON=1)')
+        self.record_state = kwags.get('record_state', False) and self.is_save and not kwags.get('replay_state')
+        self.state_frames = []
+        # plan the two arms of `together_move_to_pose` in parallel worker processes, not inside the daemon EpisodeFarm workers
+        self.parallel_plan = kwags.get('parallel_plan', False)
+        # plan the next move of `queue_moves` while the current one executes, needs the plan pool of `parallel_plan`
+        self.speculative_plan = kwags.get('speculative_plan', True)
+        self.move_queue = {'left': [], 'right': []}
+        self.speculative_plans = {'left': None, 'right': None}
+        self.speculation_stats = {'hit_num': 0, 'miss_num': 0}
+        # reuse arm plans of moves planned before, in this run or in earlier ones
+        self.plan_cache = kwags.get('plan_cache', False)
+        self.plan_cache_size = kwags.get('plan_cache_size', PLAN_CACHE_SIZE)
+        self.traj_cache = None
+        if kwags.get('use_traj_cache', False) and kwags.get('traj_cache_mode') is not None:
+            self.traj_cache = TrajectoryCache(os.path.join(self.save_dir, 'traj_cache'), kwags.get('seed', 0), kwags.get('traj_cache_mode'))
+
+        self.render_profile = select_render_profile(kwags.get('render_profile'), kwags.get('render_phase'))
+        ASSET_REGISTRY.set_max_size(kwags.get('asset_cache_size', ASSET_CACHE_SIZE))
+        set_convex_decomposition(kwags.get('convex_decomposition', 'none'))
 
         self.file_path = []
         self.plan_success = True
         self.step_lim = None
         self.fix_gripper = False
-        self.setup_scene()
+
+        # reset-in-place needs the same config, the viewer is closed by the caller after every episode
+        # and the ipc system is rebuilt per episode, so it is off with either of them
+        scene_key = {key: value for key, value in kwags.items() if key not in ('seed', 'now_ep_num')}
+        self.scene_reused = kwags.get('reuse_scene', False) and not TACTILE_ON and not self.render_freq and \
+            getattr(self, 'static_state', None) is not None and getattr(self, 'scene_key', None) == scene_key
+        self.scene_key = deepcopy(scene_key)
+        if self.scene_reused:
+            self.reset_scene()
+        else:
+            self.static_state = None
+            self.setup_scene()
 
         self.left_js = None
         self.right_js = None
@@ -104,7 +165,10 @@ class Base_task(gym.Env):
 
         self.now_obs = {}
         self.take_action_cnt = 0
+        self.step_cnt = 0
         self.eval_video_path = kwags.get('eval_video_save_dir', None)
+        # head RGB of the last observation, written to the eval video by `take_action`
+        self.eval_video_frame = None
         self.grasp_direction_dic = {
             'left':         [0,      0,   0,    -1],
             'front_left':   [-0.383, 0,   0,    -0.924],
@@ -132,6 +196,13 @@ class Base_task(gym.Env):
         self.messy_objs = list()
         self.prohibited_area = list() # [x1, y1,x2, y2]
         self.record_messy_objects = list() # record messy objects
+        self.table_occupancy = TableOccupancyGrid() # index of size_dict and prohibited_area
+        # reject object placements that no arm can grasp, before any physics runs
+        self.reachability_check = kwags.get('reachability_check', False)
+        self.reachability_height = kwags.get('reachability_height', REACH_HEIGHT)
+        self.embodiment_name = kwags.get('embodiment_name', 'embodiment')
+        self.embodiment_args = {key: kwags.get(key) for key in ('left_robot_file', 'right_robot_file', 'left_embodiment_config',
+                                'right_embodiment_config', 'dual_arm_embodied', 'embodiment_dis')}
 
         self.eval_success_cvpr = False
         self.cvpr_score = 0 
@@ -146,6 +217,50 @@ class Base_task(gym.Env):
     def _set_eval_video_ffmpeg(self,  ffmpeg):
         self.eval_video_ffmpeg = ffmpeg 
 
+    def close(self):
+        '''
+            End of episode: wait for pending saves and finalize the episode store.
+        '''
+        saver = getattr(self, 'saver', None)
+        if saver is not None and saver.submit_num > 0:
+            saver.flush()
+            stats = saver.get_stats()
+            print(f"\nasync save: {stats['submit_num']} frames, max queue depth {stats['max_queue_depth']}, "
+                  f"stalled {stats['stall_num']} times ({stats['stall_time']:.2f}s)")
+            saver.reset_stats()
+        for arm_tag in getattr(self, 'speculative_plans', {}):
+            self._drop_speculative_plan(arm_tag)
+        speculation_stats = getattr(self, 'speculation_stats', None)
+        if speculation_stats is not None and speculation_stats['hit_num'] + speculation_stats['miss_num'] > 0:
+            print(f"\nspeculative planning: {speculation_stats['hit_num']} plans committed, {speculation_stats['miss_num']} replanned")
+        if self.plan_cache and getattr(self, 'robot', None) is not None:
+            self.robot.save_plan_cache()
+        if getattr(self, 'episode_writer', None) is not None:
+            self.episode_writer.close()
+            self.episode_writer = None
+        if getattr(self, 'video_writers', None):
+            for writer in self.video_writers.values():
+                writer.close()
+            save_video_meta(self.file_path["video"] + "meta.json", self.video_writers)
+            self.video_writers = {}
+
+    def get_episode_data_path(self):
+        '''
+            Path of the data saved for the current episode, None if nothing was saved.
+        '''
+        if not self.file_path:
+            return None
+        return self.file_path.get('zarr', self.file_path.get('pkl'))
+
+    def _save(self, func, *args, **kwargs):
+        '''
+            Run a save call on the background writer if there is one, otherwise inline.
+        '''
+        if getattr(self, 'saver', None) is not None:
+            self.saver.submit(func, *args, **kwargs)
+        else:
+            func(*args, **kwargs)
+
     def play_once(self):
         pass
     
@@ -164,14 +279,15 @@ class Base_task(gym.Env):
         # declare sapien renderer
         from sapien.render import set_global_config
         set_global_config(max_num_materials = 50000, max_num_textures = 50000)
+        # the render system is still created in screen mode since actor builders attach render bodies,
+        # but nothing is ever rendered from it
         self.renderer = sapien.SapienRenderer()
         # give renderer to sapien sim
         self.engine.set_renderer(self.renderer)
         
-        sapien.render.set_camera_shader_dir("rt")
-        sapien.render.set_ray_tracing_samples_per_pixel(32)
-        sapien.render.set_ray_tracing_path_depth(8)
-        sapien.render.set_ray_tracing_denoiser("oidn")
+        if not self.screen_mode:
+            # cameras (task, observer and tactile) are created after this and all use the profile
+            apply_render_profile(get_render_profile(self.render_profile))
 
         # declare sapien scene
         scene_config = sapien.SceneConfig()
@@ -186,6 +302,8 @@ class Base_task(gym.Env):
             kwargs.get("dynamic_friction", 0.5),
             kwargs.get("restitution", 0),
         )
+        if self.screen_mode:
+            return
         # give some white ambient light of moderate intensity
         self.scene.set_ambient_light(kwargs.get("ambient_light", [0.5, 0.5, 0.5]))
         # default enable shadow unless specified otherwise
@@ -266,7 +384,56 @@ class Base_task(gym.Env):
             self.ipc_fail = False
             self.scene.add_system(self.ipc_system)
 
+    def reset_scene(self):
+        '''
+            Reset-in-place of the static world kept from the previous episode.
+                - Every entity spawned after `load_camera` (the task actors) is removed.
+                - The robot gets new planners and its joints are set up again (`Robot.reset`).
+                - Static entities, articulation qpos / qvel, drive targets and gripper values go back to
+                  their state right after `load_camera`.
+                - `create_table_and_wall`, `load_robot` and `load_camera` are then no-ops for the episode.
+                - PhysX keeps its contact and solver caches between the kept bodies, so a reused episode is not bit-identical
+                  to a fresh build, check a task with `script/check_reuse_scene.py` before turning `reuse_scene` on.
+        '''
+        for entity in self.scene.get_entities():
+            if entity.per_scene_id not in self.static_entity_ids:
+                self.scene.remove_entity(entity)
+        self.robot.reset()
+        if self.plan_cache:
+            self.robot.set_plan_cache(self.plan_cache_size)
+        self.set_state(self.static_state)
+
+    def _save_static_state(self):
+        self.static_entity_ids = {entity.per_scene_id for entity in self.scene.get_entities()}
+        self.static_state = self.get_state()
+
+    def add_table_object(self, position, radius):
+        '''
+            Reserve a disc of `radius` around an object placed on the table, in `size_dict` and `table_occupancy`.
+        '''
+        self.size_dict.append(list(position) + [radius])
+        self.table_occupancy.add_disc(position[0], position[1], radius, tag=len(self.size_dict) - 1)
+
+    def add_prohibited_area(self, area):
+        '''
+            Reserve a rectangle [x1, y1, x2, y2] of the table, in `prohibited_area` and `table_occupancy`.
+        '''
+        self.prohibited_area.append(list(area))
+        self.table_occupancy.add_rect(*area)
+
+    def is_reachable(self, position, arm_tag = None, directions = None) -> bool:
+        '''
+            Whether an object at `position` can be grasped by `arm_tag` (either arm by default) with one of `directions`
+            (keys of `GRASP_DIRECTION_DIC`, all by default). Always True when `reachability_check` is off.
+        '''
+        if not self.reachability_check:
+            return True
+        reach_map = get_reachability_map(self.embodiment_name, self.embodiment_args, self.robot.check_reachable, self.reachability_height)
+        return reach_map.is_reachable(position[0], position[1], arm_tag, directions)
+
     def create_table_and_wall(self, table_pose = [0,0], table_height = 0.74):
+        if self.scene_reused:
+            return
         # creat wall
         wall_texture, table_texture = None, None
         
@@ -325,12 +492,21 @@ class Base_task(gym.Env):
         """
             load aloha robot urdf file, set root pose and set joints
         """
+        if self.scene_reused:
+            return
 
         self.robot = Robot(self.scene, **kwags)
 
         self.robot.set_planner()
         # self.robot.set_planner(self.scene)
         self.robot.init_joints()
+        if self.plan_cache:
+            self.robot.set_plan_cache(self.plan_cache_size)
+
+        self.plan_pool = None
+        plan_specs = self.robot.get_plan_specs()
+        if self.parallel_plan and plan_specs is not None and can_start_workers():
+            self.plan_pool = get_plan_pool(plan_specs)
 
         for link in self.robot.left_entity.get_links():
             link:sapien.physx.PhysxArticulationLinkComponent = link
@@ -343,7 +519,15 @@ class Base_task(gym.Env):
         '''
             Add cameras and set camera parameters
                 - Including four cameras: left, right, front, head.
+                - In screen mode no camera is created.
         '''
+        if self.scene_reused:
+            return
+        if self.screen_mode:
+            self.cameras = None
+            self.scene.step()
+            self._save_static_state()
+            return
 
         self.cameras = Camera(**kwags)
         self.cameras.load_camera(self.scene)
@@ -361,6 +545,7 @@ class Base_task(gym.Env):
             self.ipc_system.step()
             ipc_update_render_all(self.scene)
         self.scene.update_render()  # sync pose from SAPIEN to renderer
+        self._save_static_state()
 
         # TODO
         # self.world_pcd = self.cameras.get_world_pcd()
@@ -372,6 +557,8 @@ class Base_task(gym.Env):
             Update rendering to refresh the camera's RGBD information 
             (rendering must be updated even when disabled, otherwise data cannot be collected).
         """
+        if self.screen_mode:
+            return
         self.cameras.update_wrist_camera(self.robot.left_camera.get_pose(), self.robot.right_camera.get_pose())
         
         if TACTILE_ON:
@@ -388,6 +575,7 @@ class Base_task(gym.Env):
                 viewer.render()
         '''
         self.scene.step()
+        self.step_cnt += 1
         if TACTILE_ON:
             ret = self.vsensors.update_sensors()
             if ret['status'] == 'fail':
@@ -405,6 +593,150 @@ class Base_task(gym.Env):
             self.together_close_gripper(left_pos=left_gripper_val, right_pos=right_gripper_val)
         self.render_freq = render_freq
 
+    def _plan_path(self, arm_tag, target_pose, use_point_cloud=False, use_attach=False, plan_func=None):
+        '''
+            Plan an arm motion, through the trajectory cache when it is enabled.
+                `plan_func()`, if given, computes the plan instead of the robot planner (a plan already running in the plan pool).
+        '''
+        if plan_func is None:
+            plan_path = self.robot.left_plan_path if arm_tag == 'left' else self.robot.right_plan_path
+            plan_func = lambda: plan_path(target_pose, use_point_cloud, use_attach)
+        if self.traj_cache is None:
+            return plan_func()
+        now_qpos = self.robot.left_entity.get_qpos() if arm_tag == 'left' else self.robot.right_entity.get_qpos()
+        return self.traj_cache.get_plan('arm', arm_tag, now_qpos, target_pose, plan_func)
+
+    def _plan_paths_together(self, left_target_pose, right_target_pose, use_point_cloud=False, use_attach=False):
+        '''
+            Plan both arms, at the same time in the plan pool when `parallel_plan` is on.
+                - Both plans are submitted before either is waited for, the trajectory cache still sees the left call first.
+                - Sequential on replay of the trajectory cache, where most calls are hits and need no planning,
+                  and with point clouds, which the planners of the pool do not have.
+        '''
+        plan_pool = getattr(self, 'plan_pool', None)
+        if plan_pool is None or use_point_cloud or (self.traj_cache is not None and self.traj_cache.mode == 'replay'):
+            return (self._plan_path('left', left_target_pose, use_point_cloud, use_attach),
+                    self._plan_path('right', right_target_pose, use_point_cloud, use_attach))
+        plan_funcs = {}
+        for arm_tag, target_pose in (('left', left_target_pose), ('right', right_target_pose)):
+            self._drop_speculative_plan(arm_tag)
+            plan_funcs[arm_tag], _ = self._submit_plan(plan_pool, arm_tag, target_pose, use_point_cloud, use_attach)
+        return (self._plan_path('left', left_target_pose, use_point_cloud, use_attach, plan_func=plan_funcs['left']),
+                self._plan_path('right', right_target_pose, use_point_cloud, use_attach, plan_func=plan_funcs['right']))
+
+    def _submit_plan(self, plan_pool, arm_tag, target_pose, use_point_cloud=False, use_attach=False, now_qpos=None):
+        '''
+            Start planning `arm_tag` in the plan pool, unless the plan cache has the move.
+            Returns the `plan_func` of `_plan_path` and the `PlanFuture` of the pool (None on a cache hit).
+                `now_qpos`: start of the plan, the current qpos of the arm by default.
+        '''
+        planner = self.robot.left_planner if arm_tag == 'left' else self.robot.right_planner
+        if now_qpos is None:
+            entity = self.robot.left_entity if arm_tag == 'left' else self.robot.right_entity
+            now_qpos = entity.get_qpos()
+        trans_target_pose = self.robot._trans_target_pose(target_pose, arm_tag=arm_tag)
+        result = planner.get_cached_plan(now_qpos, trans_target_pose)
+        if result is not None:
+            return (lambda: result), None
+        future = plan_pool.submit(arm_tag, now_qpos, trans_target_pose, use_point_cloud, use_attach)
+        return (lambda: planner.cache_plan(now_qpos, trans_target_pose, future.result())), future
+
+    def queue_moves(self, arm_tag, poses):
+        '''
+            Announce the next single-arm moves of `arm_tag`, in order, for speculative planning.
+                - While a move of the arm executes, the next queued pose is planned in the plan pool from the end qpos
+                  the current trajectory predicts.
+                - The speculative plan is committed if the next `*_move_to_pose` call goes to that pose and the arm ended
+                  within `SPECULATIVE_QPOS_TOL` of the prediction, otherwise it is cancelled and the move is planned again.
+                  The start of a committed plan is blended from the actual qpos over `SPECULATIVE_BLEND_STEPS` steps.
+                - A move to a pose that is not the head of the queue clears the queue.
+        '''
+        self.move_queue[arm_tag] = [np.array(pose, dtype=np.float64) for pose in poses]
+
+    def _can_speculate(self, use_point_cloud=False) -> bool:
+        return self.speculative_plan and getattr(self, 'plan_pool', None) is not None and not use_point_cloud \
+            and (self.traj_cache is None or self.traj_cache.mode != 'replay')
+
+    def _drop_speculative_plan(self, arm_tag):
+        '''
+            Cancel the speculative plan of `arm_tag`, so its worker is free for the next plan.
+        '''
+        speculation, self.speculative_plans[arm_tag] = self.speculative_plans[arm_tag], None
+        if speculation is not None and speculation['future'] is not None:
+            self.plan_pool.cancel(arm_tag, speculation['future'])
+
+    def _take_speculative_plan(self, arm_tag, pose):
+        '''
+            Pop `pose` from the move queue and return the `plan_func` of its speculative plan if it is still valid, else None.
+        '''
+        queue = self.move_queue[arm_tag]
+        if len(queue) > 0 and np.allclose(queue[0], pose):
+            queue.pop(0)
+        else:
+            queue.clear()
+        speculation = self.speculative_plans[arm_tag]
+        if speculation is None:
+            return None
+        planner = self.robot.left_planner if arm_tag == 'left' else self.robot.right_planner
+        entity = self.robot.left_entity if arm_tag == 'left' else self.robot.right_entity
+        joint_indices = planner.planner.move_group_joint_indices
+        now_qpos = np.array(entity.get_qpos(), dtype=np.float64)
+        if not np.allclose(speculation['pose'], pose) or \
+                np.abs(now_qpos[joint_indices] - speculation['qpos'][joint_indices]).max() > SPECULATIVE_QPOS_TOL:
+            self.speculation_stats['miss_num'] += 1
+            self._drop_speculative_plan(arm_tag)
+            return None
+        self.speculative_plans[arm_tag] = None
+        self.speculation_stats['hit_num'] += 1
+        offset = now_qpos[joint_indices] - speculation['qpos'][joint_indices]
+        return lambda: self._blend_plan_start(speculation['plan_func'](), offset)
+
+    @staticmethod
+    def _blend_plan_start(result, offset):
+        '''
+            Shift the start of a plan by `offset` (actual - planned start qpos), fading out over `SPECULATIVE_BLEND_STEPS`
+            steps, so the arm does not jump to the first waypoint. The arrays are copied, `result` may be cached.
+        '''
+        if result['status'] != 'Success':
+            return result
+        result = dict(result)
+        position = np.array(result['position'], dtype=np.float64)
+        blend_num = min(SPECULATIVE_BLEND_STEPS, len(position))
+        position[:blend_num] += np.linspace(1., 0., blend_num, endpoint=False)[:, None] * offset[None]
+        result['position'] = position
+        return result
+
+    def _speculate_next_move(self, arm_tag, result, use_point_cloud=False, use_attach=False):
+        '''
+            Start planning the next queued move of `arm_tag` from the end of `result`, the move about to execute.
+        '''
+        queue = self.move_queue[arm_tag]
+        if len(queue) == 0 or result['status'] != 'Success' or not self._can_speculate(use_point_cloud):
+            return
+        planner = self.robot.left_planner if arm_tag == 'left' else self.robot.right_planner
+        entity = self.robot.left_entity if arm_tag == 'left' else self.robot.right_entity
+        predicted_qpos = np.array(entity.get_qpos(), dtype=np.float64)
+        predicted_qpos[planner.planner.move_group_joint_indices] = result['position'][-1]
+        plan_func, future = self._submit_plan(self.plan_pool, arm_tag, queue[0], use_point_cloud, use_attach, now_qpos=predicted_qpos)
+        self.speculative_plans[arm_tag] = {'pose': queue[0], 'qpos': predicted_qpos, 'plan_func': plan_func, 'future': future}
+
+    def _plan_move(self, arm_tag, pose, use_point_cloud=False, use_attach=False):
+        '''
+            Plan a single-arm move, with its speculative plan when there is a valid one,
+            then speculatively plan the next queued move of the arm.
+        '''
+        plan_func = self._take_speculative_plan(arm_tag, pose)
+        result = self._plan_path(arm_tag, pose, use_point_cloud, use_attach, plan_func=plan_func)
+        self._speculate_next_move(arm_tag, result, use_point_cloud, use_attach)
+        return result
+
+    def _plan_grippers(self, arm_tag, now_val, target_val):
+        planner = self.robot.left_planner if arm_tag == 'left' else self.robot.right_planner
+        if self.traj_cache is None:
+            return planner.plan_grippers(now_val, target_val)
+        return self.traj_cache.get_plan('gripper', arm_tag, now_val, target_val,
+                                        lambda: planner.plan_grippers(now_val, target_val))
+
     def set_gripper(self, set_tag = 'together', left_pos = None, right_pos = None, save_freq=-1):
         '''
             Set gripper posture
@@ -421,14 +753,14 @@ class Base_task(gym.Env):
         step_n = 0
         if set_tag == 'left' or set_tag == 'together':
             # left_result = self.robot.left_planner.plan_grippers(self.robot.get_left_gripper_real_val(), left_pos)
-            left_result = self.robot.left_planner.plan_grippers(self.robot.get_left_gripper_val(), left_pos)
+            left_result = self._plan_grippers('left', self.robot.get_left_gripper_val(), left_pos)
             left_gripper_step = left_result['step']
             left_gripper_res = left_result['result']
             step_n = left_result['step_n']
 
         if set_tag == 'right' or set_tag == 'together':
             # right_result = self.robot.right_planner.plan_grippers(self.robot.get_right_gripper_real_val(), right_pos)
-            right_result = self.robot.right_planner.plan_grippers(self.robot.get_right_gripper_val(), right_pos)
+            right_result = self._plan_grippers('right', self.robot.get_right_gripper_val(), right_pos)
             right_gripper_step = right_result['step']
             right_gripper_res = right_result['result']
             step_n = right_result['step_n']
@@ -478,7 +810,7 @@ class Base_task(gym.Env):
         Will not avoid collision and will fail if the path contains collision.
         """
         save_freq = self.save_freq if save_freq == -1 else save_freq
-        left_result = self.robot.left_plan_path(pose, use_point_cloud, use_attach)
+        left_result = self._plan_move('left', pose, use_point_cloud, use_attach)
 
         if left_result["status"] != "Success":
             self.plan_success = False
@@ -511,7 +843,7 @@ class Base_task(gym.Env):
         Will not avoid collision and will fail if the path contains collision.
         """
         save_freq = self.save_freq if save_freq == -1 else save_freq
-        right_result = self.robot.right_plan_path(pose, use_point_cloud, use_attach)
+        right_result = self._plan_move('right', pose, use_point_cloud, use_attach)
 
         if right_result["status"] != "Success":
             self.plan_success = False
@@ -543,8 +875,7 @@ class Base_task(gym.Env):
         Will not avoid collision and will fail if the path contains collision.
         """
         save_freq = self.save_freq if save_freq == -1 else save_freq
-        left_result = self.robot.left_plan_path(left_target_pose, use_point_cloud, use_attach)
-        right_result = self.robot.right_plan_path(right_target_pose, use_point_cloud, use_attach)
+        left_result, right_result = self._plan_paths_together(left_target_pose, right_target_pose, use_point_cloud, use_attach)
 
         left_success = left_result["status"] == "Success"
         right_success = right_result["status"] == "Success"
@@ -786,22 +1117,114 @@ class Base_task(gym.Env):
         if not self.is_save:
             return
         print('saving: episode = ', self.ep_num, ' index = ',self.PCD_INDEX, end='\r')
+        if self.record_state:
+            self.state_frames.append(self.get_state())
 
         if self.PCD_INDEX==0:
-            self.file_path ={
-                "pkl" : f"{self.save_dir}/episode{self.ep_num}/",
-            }
+            if self.save_format == 'zarr':
+                self.file_path = {
+                    "zarr" : f"{self.save_dir}/episode{self.ep_num}.zarr",
+                }
+                self.episode_writer = EpisodeWriter(self.file_path["zarr"], chunk_frames=self.save_chunk_frames)
+            else:
+                self.file_path ={
+                    "pkl" : f"{self.save_dir}/episode{self.ep_num}/",
+                }
 
-            for directory in self.file_path.values():
-                if os.path.exists(directory):
-                    file_list = os.listdir(directory)
-                    for file in file_list:
-                        os.remove(directory + file)
+                for directory in self.file_path.values():
+                    if os.path.exists(directory):
+                        file_list = os.listdir(directory)
+                        for file in file_list:
+                            os.remove(directory + file)
         pkl_dic = self.get_obs(is_policy=False)
-        save_pkl(self.file_path["pkl"]+f"{self.PCD_INDEX}.pkl", pkl_dic)
+        if self.data_type.get('rgb_video', False):
+            self._save_rgb_video(pkl_dic)
+        if self.PCD_INDEX == 0 and self.data_type.get('segmentation_format', 'palette') == 'id' and \
+           (self.data_type.get('mesh_segmentation', False) or self.data_type.get('actor_segmentation', False)):
+            self._save(save_json, f"{self.save_dir}/segmentation/episode{self.ep_num}.json", self.get_segmentation_id_table())
+        if self.save_format == 'zarr':
+            self._save(self.episode_writer.append, pkl_dic)
+        else:
+            self._save(save_pkl, self.file_path["pkl"]+f"{self.PCD_INDEX}.pkl", pkl_dic, self.save_fsync)
         self.PCD_INDEX +=1
     
+    def get_state(self) -> dict:
+        return {
+            "scene": get_scene_state(self.scene),
+            "robot": self.robot.get_drive_state(),
+        }
+
+    def set_state(self, state: dict):
+        set_scene_state(self.scene, state['scene'])
+        self.robot.set_drive_state(state['robot'])
+
+    def save_state_record(self, info = None):
+        '''
+            Save the recorded frame states and the `play_once` info of the episode to `state/episode{ep_num}.pkl`.
+        '''
+        self._save(save_pkl, f"{self.save_dir}/state/episode{self.ep_num}.pkl", {"info": info, "frames": self.state_frames})
+        self.state_frames = []
+
+    def replay_render(self, state_path):
+        '''
+            Re-render an episode recorded with `record_state` instead of playing it.
+                - Every recorded frame is restored and captured, physics is not stepped and nothing is planned.
+                - The scene must be set up with the same seed as the recording.
+                - Returns the `play_once` info of the recorded episode.
+        '''
+        if TACTILE_ON:
+            raise RuntimeError('replay is not supported with tactile sensors')
+        with open(state_path, 'rb') as f:
+            record = pickle.load(f)
+        for state in record['frames']:
+            self.set_state(state)
+            self._take_picture()
+        return record['info']
+
+    def _save_rgb_video(self, pkl_dic):
+        '''
+            Move camera RGB out of the frame into per-camera video streams.
+                - `rgb` is replaced by `rgb_frame`, the frame index in `video/episode{ep_num}/{camera_name}.mp4`.
+        '''
+        if self.PCD_INDEX == 0:
+            self.file_path["video"] = f"{self.save_dir}/video/episode{self.ep_num}/"
+        for camera_name, camera_obs in pkl_dic['observation'].items():
+            if 'rgb' not in camera_obs:
+                continue
+            rgb = camera_obs.pop('rgb')
+            if camera_name not in self.video_writers:
+                self.video_writers[camera_name] = VideoStreamWriter(
+                    self.file_path["video"] + f"{camera_name}.mp4", width=rgb.shape[1], height=rgb.shape[0])
+            # every capture writes one frame to every stream, so the video frame index is the capture index
+            camera_obs['rgb_frame'] = self.PCD_INDEX
+            self._save(self.video_writers[camera_name].write, rgb)
+
+    def get_segmentation_id_table(self) -> dict:
+        '''
+            Names of the segmentation label ids of the current scene.
+                - `actor`: entity id -> entity name.
+                - `mesh`: render shape id -> name of the entity owning the shape.
+        '''
+        table = {'actor': {}, 'mesh': {}}
+        for entity in self.scene.get_entities():
+            table['actor'][int(entity.per_scene_id)] = entity.get_name()
+            render_body = entity.find_component_by_type(sapien.render.RenderBodyComponent)
+            if render_body is None:
+                continue
+            for shape in render_body.render_shapes:
+                table['mesh'][int(shape.per_scene_id)] = entity.get_name()
+        return table
+
     def get_obs(self, is_policy = True):
+        '''
+            Storage dtypes are taken from `data_type`:
+                - `depth_dtype` / `depth_scale`: e.g. uint16 with scale 1000 stores millimetres (default float64 millimetres).
+                - `pcd_dtype`: e.g. float16 (default unchanged).
+                - `segmentation_format`: "palette" RGB (default) or "id", raw label ids in `segmentation_dtype`.
+            With `is_policy` the observation is a `LazyObs`, see `get_lazy_obs`.
+        '''
+        if is_policy:
+            return self.get_lazy_obs()
         self._update_render()
         self.cameras.update_picture()
         if TACTILE_ON:
@@ -831,102 +1254,168 @@ class Base_task(gym.Env):
 
         pkl_dic['observation'] = self.cameras.get_config()
         # # ---------------------------------------------------------------------------- #
-        # # RGBA
+        # # RGBA, segmentation, depth and pointcloud, one readback per camera and render target
         # # ---------------------------------------------------------------------------- #
-        if self.data_type.get('rgb', False):
-            rgba = self.cameras.get_rgba()
-            for camera_name in rgba.keys():
-                pkl_dic['observation'][camera_name].update(rgba[camera_name])
+        modalities = [modality for modality in ['rgb', 'mesh_segmentation', 'actor_segmentation', 'depth', 'pointcloud']
+                      if self.data_type.get(modality, False)]
+        capture = self.cameras.capture(
+            modalities,
+            is_conbine=self.data_type.get("conbine", False),
+            depth_dtype=self.data_type.get('depth_dtype', 'float64'),
+            depth_scale=self.data_type.get('depth_scale', 1000.0),
+            seg_as_id=self.data_type.get('segmentation_format', 'palette') == 'id',
+            seg_dtype=np.dtype(self.data_type.get('segmentation_dtype', 'uint16')),
+        )
+        for camera_name, camera_res in capture['cameras'].items():
+            pkl_dic['observation'][camera_name].update(camera_res)
         
         if self.data_type.get('observer', False):
             observer = self.cameras.get_obs_rgba()
             pkl_dic['obs_rgba'] = observer
         # # ---------------------------------------------------------------------------- #
-        # # mesh_segmentation
-        # # ---------------------------------------------------------------------------- # 
-        if self.data_type.get('mesh_segmentation', False):
-            mesh_segmentation = self.cameras.get_segmentation(level='mesh')
-            for camera_name in mesh_segmentation.keys():
-                pkl_dic['observation'][camera_name].update(mesh_segmentation[camera_name])
-        # # ---------------------------------------------------------------------------- #
-        # # actor_segmentation
-        # # --------------------------------------------------------------------------- # 
-        if self.data_type.get('actor_segmentation', False):
-            actor_segmentation = self.cameras.get_segmentation(level='actor')
-            for camera_name in actor_segmentation.keys():
-                pkl_dic['observation'][camera_name].update(actor_segmentation[camera_name])
-        # # ---------------------------------------------------------------------------- #
-        # # DEPTH
-        # # ---------------------------------------------------------------------------- #
-        if self.data_type.get('depth', False):
-            depth = self.cameras.get_depth()
-            for camera_name in depth.keys():
-                pkl_dic['observation'][camera_name].update(depth[camera_name])
-        # # ---------------------------------------------------------------------------- #
         # # endpose JSON
         # # ---------------------------------------------------------------------------- #
         if self.data_type.get('endpose', False):
-            
-            def trans_endpose_quat2rpy(endpose, gripper_val):
-                rpy = t3d.euler.quat2euler(endpose[-4:])
-                roll, pitch, yaw = rpy
-                x,y,z = endpose[:3]
-                endpose = {
-                    "gripper": float(gripper_val),
-                    "pitch" : float(pitch),
-                    "roll" : float(roll),
-                    "x": float(x),
-                    "y": float(y),
-                    "yaw" : float(yaw),
-                    "z": float(z),
-                }
-                return endpose
-
-            # TODO
-            norm_gripper_val = [self.robot.get_left_gripper_val(), self.robot.get_right_gripper_val()]
-            left_endpose = trans_endpose_quat2rpy(self.robot.get_left_endpose(), norm_gripper_val[0])
-            right_endpose = trans_endpose_quat2rpy(self.robot.get_right_endpose(), norm_gripper_val[1])
-
-            # tmp
-            # left_endpose = trans_endpose_quat2rpy(self.robot.get_left_orig_endpose(), norm_gripper_val[0])
-            # right_endpose = trans_endpose_quat2rpy(self.robot.get_right_orig_endpose(), norm_gripper_val[1])
-
-            if self.dual_arm:
-                pkl_dic["endpose"] = np.array([left_endpose["x"],left_endpose["y"],left_endpose["z"],left_endpose["roll"],
-                                            left_endpose["pitch"],left_endpose["yaw"],left_endpose["gripper"],
-                                            right_endpose["x"],right_endpose["y"],right_endpose["z"],right_endpose["roll"],
-                                            right_endpose["pitch"],right_endpose["yaw"],right_endpose["gripper"],])
-            else:
-                pkl_dic["endpose"] = np.array([right_endpose["x"],right_endpose["y"],right_endpose["z"],right_endpose["roll"],
-                                                right_endpose["pitch"],right_endpose["yaw"],right_endpose["gripper"],])
-
-            # tmp
-            # pkl_dic["endpose"] = self.robot.get_left_orig_endpose()
+            pkl_dic["endpose"] = self.get_endpose_obs()
         # # ---------------------------------------------------------------------------- #
         # # JointState JSON
         # # ---------------------------------------------------------------------------- #
         if self.data_type.get('qpos', False):
-            
-            left_jointstate = self.robot.get_left_arm_jointState()
-            right_jointstate = self.robot.get_right_arm_jointState()
-
-            #tmp
-            # left_jointstate = self.robot.get_left_arm_real_jointState()
-            # right_jointstate = self.robot.get_right_arm_real_jointState()
-            
-            if self.dual_arm:
-                pkl_dic["joint_action"] = np.array(left_jointstate+right_jointstate)
-            else:
-                pkl_dic["joint_action"] = np.array(right_jointstate)
+            pkl_dic["joint_action"] = self.get_qpos_obs()
             
         # # ---------------------------------------------------------------------------- #
         # # PointCloud
         # # ---------------------------------------------------------------------------- #      
         if self.data_type.get('pointcloud', False):
-            pkl_dic["pointcloud"] = self.cameras.get_pcd(self.data_type.get("conbine", False))
+            pkl_dic["pointcloud"] = self._cast_pcd(capture['pointcloud'])
         #===========================================================#
         self.now_obs = pkl_dic
+        if self.eval_video_path is not None:
+            self.eval_video_frame = pkl_dic['observation']['head_camera']['rgb']
         return pkl_dic
+
+    def get_endpose_obs(self) -> np.ndarray:
+        def trans_endpose_quat2rpy(endpose, gripper_val):
+            rpy = t3d.euler.quat2euler(endpose[-4:])
+            roll, pitch, yaw = rpy
+            x,y,z = endpose[:3]
+            endpose = {
+                "gripper": float(gripper_val),
+                "pitch" : float(pitch),
+                "roll" : float(roll),
+                "x": float(x),
+                "y": float(y),
+                "yaw" : float(yaw),
+                "z": float(z),
+            }
+            return endpose
+
+        # TODO
+        norm_gripper_val = [self.robot.get_left_gripper_val(), self.robot.get_right_gripper_val()]
+        left_endpose = trans_endpose_quat2rpy(self.robot.get_left_endpose(), norm_gripper_val[0])
+        right_endpose = trans_endpose_quat2rpy(self.robot.get_right_endpose(), norm_gripper_val[1])
+
+        # tmp
+        # left_endpose = trans_endpose_quat2rpy(self.robot.get_left_orig_endpose(), norm_gripper_val[0])
+        # right_endpose = trans_endpose_quat2rpy(self.robot.get_right_orig_endpose(), norm_gripper_val[1])
+
+        if self.dual_arm:
+            return np.array([left_endpose["x"],left_endpose["y"],left_endpose["z"],left_endpose["roll"],
+                             left_endpose["pitch"],left_endpose["yaw"],left_endpose["gripper"],
+                             right_endpose["x"],right_endpose["y"],right_endpose["z"],right_endpose["roll"],
+                             right_endpose["pitch"],right_endpose["yaw"],right_endpose["gripper"],])
+        return np.array([right_endpose["x"],right_endpose["y"],right_endpose["z"],right_endpose["roll"],
+                         right_endpose["pitch"],right_endpose["yaw"],right_endpose["gripper"],])
+
+    def get_qpos_obs(self) -> np.ndarray:
+        left_jointstate = self.robot.get_left_arm_jointState()
+        right_jointstate = self.robot.get_right_arm_jointState()
+
+        #tmp
+        # left_jointstate = self.robot.get_left_arm_real_jointState()
+        # right_jointstate = self.robot.get_right_arm_real_jointState()
+
+        if self.dual_arm:
+            return np.array(left_jointstate+right_jointstate)
+        return np.array(right_jointstate)
+
+    def get_pcd_obs(self):
+        return self._cast_pcd(self.cameras.get_pcd(self.data_type.get("conbine", False)))
+
+    def _cast_pcd(self, pcd):
+        if self.data_type.get('pcd_dtype', None) is not None and pcd is not None:
+            pcd = pcd.astype(self.data_type['pcd_dtype'])
+        return pcd
+
+    def get_lazy_obs(self) -> LazyObs:
+        '''
+            `get_obs` for policies, same layout, but every camera picture and modality is computed on first access.
+                - A camera is rendered only when one of its images (or the point cloud) is read.
+                - Values are memoized, the observation belongs to the frame it was taken at,
+                  computing a value after the scene has been stepped raises an error.
+                - With `eval_video_save_dir` the head RGB is loaded at once, `take_action` may step the scene
+                  several times per observation before writing it to the eval video.
+        '''
+        self._update_render()
+        cameras = self.cameras.get_collect_cameras()
+        camera_config = self.cameras.get_config()
+        step_cnt = self.step_cnt
+        taken = set()
+
+        def check_frame():
+            if self.step_cnt != step_cnt:
+                raise RuntimeError('observation read after the scene was stepped, call get_obs again')
+
+        def take_picture(camera_names):
+            for camera_name in camera_names:
+                if camera_name not in taken:
+                    cameras[camera_name].take_picture()
+                    taken.add(camera_name)
+
+        def camera_loader(camera_name, get_func, *args):
+            def loader():
+                take_picture([camera_name])
+                return get_func(cameras[camera_name], *args)
+            return loader
+
+        def pcd_loader():
+            take_picture(cameras.keys())
+            return self.get_pcd_obs()
+
+        seg_as_id = self.data_type.get('segmentation_format', 'palette') == 'id'
+        seg_dtype = np.dtype(self.data_type.get('segmentation_dtype', 'uint16'))
+        observation = {}
+        for camera_name in cameras.keys():
+            camera_obs = dict(camera_config[camera_name])
+            if self.data_type.get('rgb', False):
+                camera_obs['rgb'] = camera_loader(camera_name, self.cameras.get_camera_rgba)
+            for level in ['mesh', 'actor']:
+                if self.data_type.get(f'{level}_segmentation', False):
+                    camera_obs[f'{level}_segmentation'] = camera_loader(camera_name, self.cameras.get_camera_segmentation, level, seg_as_id, seg_dtype)
+            if self.data_type.get('depth', False):
+                camera_obs['depth'] = camera_loader(camera_name, self.cameras.get_camera_depth,
+                                                    self.data_type.get('depth_dtype', 'float64'), self.data_type.get('depth_scale', 1000.0))
+            observation[camera_name] = camera_obs
+
+        obs = {
+            "observation": observation,
+            "pointcloud": pcd_loader if self.data_type.get('pointcloud', False) else [],
+            "joint_action": self.get_qpos_obs if self.data_type.get('qpos', False) else [],
+            "endpose": self.get_endpose_obs if self.data_type.get('endpose', False) else [],
+        }
+        if self.data_type.get('observer', False):
+            obs['obs_rgba'] = self.cameras.get_obs_rgba
+        if TACTILE_ON:
+            self.vsensors.update_picture()
+            obs['vision_tactile'] = self.vsensors.get_config()
+            if self.data_type.get('vision_tactile', True):
+                rgb = self.vsensors.get_rgb()
+                for sensor_name in rgb.keys():
+                    obs['vision_tactile'][sensor_name].update(rgb[sensor_name])
+        self.now_obs = LazyObs(obs, check_frame)
+        if self.eval_video_path is not None:
+            self.eval_video_frame = self.now_obs['observation']['head_camera']['rgb']
+        return self.now_obs
         
     def get_cam_obs(self, observation: dict) -> dict:
         head_cam = np.moveaxis(observation['observation']['head_camera']['rgb'], -1, 0) / 255
@@ -947,7 +1436,7 @@ class Base_task(gym.Env):
         eval_video_freq = 15
         
         if self.eval_video_path is not None and self.take_action_cnt % eval_video_freq == 0:
-            self.eval_video_ffmpeg.stdin.write(self.now_obs['observation']['head_camera']['rgb'].tobytes())
+            self.eval_video_ffmpeg.stdin.write(self.eval_video_frame.tobytes())
 
         self.take_action_cnt += 1
         print(f'step: {self.take_action_cnt} / {self.step_lim}', end='\r')
@@ -64,7 +64,8 @@ class blocks_stack_hard(Base_task):
             rotate_lim=[0,0,1.],
         )
 
-        while abs(block_pose.p[0]) < 0.05 or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225:
+        while abs(block_pose.p[0]) < 0.05 or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225 \
+              or not self.is_block_reachable(block_pose.p):
             block_pose = rand_pose(
                 xlim=[-0.25,0.25],
                 ylim=[-0.15,0.05],
@@ -94,7 +95,7 @@ class blocks_stack_hard(Base_task):
         )
 
         while abs(block_pose.p[0]) < 0.05 or np.sum(pow(block_pose.p[:2] - self.block1.get_pose().p[:2],2)) < 0.01 \
-              or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225:
+              or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225 or not self.is_block_reachable(block_pose.p):
             block_pose = rand_pose(
                 xlim=[-0.25,0.25],
                 ylim=[-0.15,0.05],
@@ -115,7 +116,8 @@ class blocks_stack_hard(Base_task):
         )
 
         while abs(block_pose.p[0]) < 0.05 or np.sum(pow(block_pose.p[:2] - self.block1.get_pose().p[:2],2)) < 0.01 or \
-              np.sum(pow(block_pose.p[:2] - self.block2.get_pose().p[:2],2)) < 0.01 or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225:
+              np.sum(pow(block_pose.p[:2] - self.block2.get_pose().p[:2],2)) < 0.01 or np.sum(pow(block_pose.p[:2] - np.array([0,-0.1]),2)) < 0.0225 or \
+              not self.is_block_reachable(block_pose.p):
             block_pose = rand_pose(
                 xlim=[-0.25,0.25],
                 ylim=[-0.15,0.05],
@@ -142,14 +144,18 @@ class blocks_stack_hard(Base_task):
         self.block3.find_component_by_type(sapien.physx.PhysxRigidDynamicComponent).mass = 0.01
 
         pose = self.block1.get_pose().p
-        self.prohibited_area.append([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04])
+        self.add_prohibited_area([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04])
         pose = self.block2.get_pose().p
-        self.prohibited_area.append([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04]) 
+        self.add_prohibited_area([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04])
         pose = self.block3.get_pose().p
-        self.prohibited_area.append([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04])
+        self.add_prohibited_area([pose[0]-0.04,pose[1]-0.04,pose[0]+0.04,pose[1]+0.04])
         # target_pose = [-0.04,-0.13,0.04,-0.05]
     #     self.prohibited_area.append(target_pose)
 
+    def is_block_reachable(self, position):
+        # blocks are grasped top-down by the arm on their side of the table
+        return self.is_reachable(position, arm_tag='left' if position[0] < 0 else 'right', directions=['top_down'])
+
     def play_once(self):
         # Retrieve actor objects and data
         self.las_gripper = None
@@ -179,7 +185,9 @@ class blocks_stack_hard(Base_task):
             left_target_pose = self.robot.left_original_pose if self.las_gripper == 'left' else pre_grasp_pose
             right_target_pose = self.robot.right_original_pose if self.las_gripper == 'right' else pre_grasp_pose
             self.together_move_to_pose(left_target_pose=left_target_pose, right_target_pose=right_target_pose)
+            self.queue_moves(arm_tag, [target_grasp_pose, pre_grasp_pose])
         else:
+            self.queue_moves(arm_tag, [pre_grasp_pose, target_grasp_pose, pre_grasp_pose])
             move_func(pre_grasp_pose)
 
         # move_func(pre_grasp_pose)
@@ -192,6 +200,7 @@ class blocks_stack_hard(Base_task):
         pre_place_pose = self.get_grasp_pose_from_goal_point_and_direction(block, block_data, endpose_tag=arm_tag, actor_functional_point_id=0, target_point=target_pose, target_approach_direction=target_approach_direction, pre_dis=0.09)
         target_place_pose = self.get_grasp_pose_from_goal_point_and_direction(block, block_data, endpose_tag=arm_tag, actor_functional_point_id=0, target_point=target_pose, target_approach_direction=target_approach_direction, pre_dis=0)
         
+        self.queue_moves(arm_tag, [pre_place_pose, target_place_pose, pre_place_pose])
         move_func(pre_place_pose)
         move_func(target_place_pose)
         open_gripper()
@@ -3,39 +3,137 @@ import numpy as np
 import pdb
 import numpy as np
 from PIL import Image, ImageColor
-import open3d as o3d
+from ..utils.lazy_import import lazy_import, optional_import
+# heavy modules are imported on first use, so importing envs stays cheap
+o3d = lazy_import('open3d')
 import json
 import transforms3d as t3d
-import cv2
-import torch
+cv2 = lazy_import('cv2')
+torch = lazy_import('torch')
 import yaml
-import trimesh
+trimesh = lazy_import('trimesh')
 import math
 from .._GLOBAL_CONFIGS import CONFIGS_PATH
+from ..utils.farthest_point_sampler import sample_farthest_points
 import os
 from sapien.sensor import StereoDepthSensor, StereoDepthSensorConfig
 
-try:
-    import pytorch3d.ops as torch3d_ops
-    def fps(points, num_points=1024, use_cuda=True):
+def cuda_available() -> bool:
+    '''
+        Whether torch is installed and sees a CUDA device, False on CPU-only nodes without torch.
+    '''
+    torch_module = optional_import('torch')
+    return torch_module is not None and torch_module.cuda.is_available()
+
+def fps(points, num_points=1024, use_cuda=True, voxel_size=0., seed=None):
+    '''
+        Farthest point sampling, returns the sampled points and their 1-D index array.
+            - pytorch3d on the GPU when `use_cuda` and it is installed.
+            - Otherwise the built-in sampler of `utils.farthest_point_sampler`, with optional voxel pre-reduction.
+    '''
+    torch3d_ops = optional_import('pytorch3d.ops') if use_cuda and cuda_available() else None
+    if torch3d_ops is not None:
         K = [num_points]
-        if use_cuda:
-            points = torch.from_numpy(points).cuda()
-            sampled_points, indices = torch3d_ops.sample_farthest_points(points=points.unsqueeze(0), K=K)
-            sampled_points = sampled_points.squeeze(0)
-            sampled_points = sampled_points.cpu().numpy()
-        else:
-            points = torch.from_numpy(points)
-            sampled_points, indices = torch3d_ops.sample_farthest_points(points=points.unsqueeze(0), K=K)
-            sampled_points = sampled_points.squeeze(0)
-            sampled_points = sampled_points.numpy()
-
-        return sampled_points, indices
-except:
-    print('missing pytorch3d')
-    def fps(points, num_points=1024, use_cuda=True):
-        print('fps error: missing pytorch3d')
-        exit()
+        points = torch.from_numpy(points).cuda()
+        sampled_points, indices = torch3d_ops.sample_farthest_points(points=points.unsqueeze(0), K=K)
+        sampled_points = sampled_points.squeeze(0)
+        sampled_points = sampled_points.cpu().numpy()
+        return sampled_points, indices.cpu().numpy()[0]
+    return sample_farthest_points(points, num_points, voxel_size=voxel_size, seed=seed)
+
+def get_camera_pcd_torch(camera, crop_bbox = None) -> np.ndarray:
+    '''
+        [N, 6] float32 world-frame xyz + rgb of a camera, computed with torch on the camera's CUDA buffers.
+    '''
+    rgba = camera.get_picture_cuda("Color").torch() # [H, W, 4]
+    position = camera.get_picture_cuda("Position").torch()
+    model_matrix = camera.get_model_matrix()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model_matrix = torch.tensor(model_matrix, dtype=torch.float32).to(device)
+
+    # Extract valid three-dimensional points and corresponding color data.
+    valid_mask = position[..., 3] < 1
+    points_opengl = position[..., :3][valid_mask]
+    points_color = rgba[valid_mask][:,:3]
+    # Transform into the world coordinate system.
+    points_world = torch.bmm(points_opengl.view(1, -1, 3), model_matrix[:3, :3].transpose(0,1).view(-1, 3, 3)).squeeze(1) + model_matrix[:3, 3]
+
+    # Format color data.
+    points_color = torch.clamp(points_color, 0, 1)
+
+    points_world = points_world.squeeze(0)
+    
+    # If crop is needed
+    if crop_bbox is not None:
+        min_bound = torch.tensor(crop_bbox[0], dtype=torch.float32).to(device)
+        max_bound = torch.tensor(crop_bbox[1], dtype=torch.float32).to(device)
+        inside_bounds_mask = (points_world.squeeze(0) >= min_bound).all(dim=1) & (points_world.squeeze(0)  <= max_bound).all(dim=1)
+        points_world = points_world[inside_bounds_mask]
+        points_color = points_color[inside_bounds_mask]
+    
+    # Convert the tensor back to a NumPy array for use with Open3D.
+    points_world_np = points_world.cpu().numpy()
+    points_color_np = points_color.cpu().numpy()
+
+    return np.hstack((points_world_np, points_color_np))
+
+# palette of the RGB segmentation images, label id i is drawn in color i
+SEGMENTATION_PALETTE = np.array(
+    [ImageColor.getrgb(color) for color in sorted(set(ImageColor.colormap.values()))], dtype=np.uint8
+)
+
+def rgb_from_picture(color) -> np.ndarray:
+    return (color * 255).clip(0, 255).astype("uint8")[:,:,:3]
+
+# depth is stored as `depth_m * scale` in `dtype`, integer dtypes are rounded and clipped to their range
+def depth_from_picture(position, dtype = np.float64, scale = 1000.0) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    depth = -position[..., 2]
+    depth_image = depth * scale
+    if dtype.kind in 'ui':
+        depth_image = np.clip(np.round(depth_image), 0, np.iinfo(dtype).max)
+    return depth_image.astype(dtype)
+
+# `as_id=True` returns the raw label ids in `id_dtype` instead of palette RGB
+def segmentation_from_picture(seg_labels, level = "mesh", as_id = False, id_dtype = np.uint16) -> np.ndarray:
+    # visual_id is the unique id of each visual shape
+    label_image = seg_labels[..., 0] if level == "mesh" else seg_labels[..., 1] # mesh-level / actor-level
+    if as_id:
+        return label_image.astype(id_dtype)
+    return SEGMENTATION_PALETTE[label_image.astype(np.uint8)]
+
+def pcd_from_pictures(position, color, model_matrix, crop_bbox = None, buffer = None) -> np.ndarray:
+    '''
+        [N, 6] float32 world-frame xyz + rgb from a camera's Position and Color pictures, with NumPy.
+            - `buffer`: reusable [H * W, 6] float32 array the points are assembled in, so a frame allocates only its result.
+    '''
+    position = position.reshape(-1, 4) # [H * W, 4] float32
+    rgba = color.reshape(-1, 4)
+    if buffer is None or buffer.shape[0] < position.shape[0]:
+        buffer = np.empty((position.shape[0], 6), dtype=np.float32)
+    model_matrix = np.asarray(model_matrix, dtype=np.float32)
+
+    # valid points, transformed into the world frame and joined with their color inside the buffer
+    valid_mask = position[:, 3] < 1
+    point_num = int(np.count_nonzero(valid_mask))
+    res = buffer[:point_num]
+    np.matmul(position[valid_mask, :3], model_matrix[:3, :3].T, out=res[:, :3])
+    res[:, :3] += model_matrix[:3, 3]
+    np.clip(rgba[valid_mask, :3], 0, 1, out=res[:, 3:])
+
+    if crop_bbox is None:
+        return res.copy()
+    min_bound = np.asarray(crop_bbox[0], dtype=np.float32)
+    max_bound = np.asarray(crop_bbox[1], dtype=np.float32)
+    inside_bounds_mask = np.all((res[:, :3] >= min_bound) & (res[:, :3] <= max_bound), axis=1)
+    return res[inside_bounds_mask]
+
+def get_camera_pcd_numpy(camera, crop_bbox = None, buffer = None) -> np.ndarray:
+    '''
+        Same result as `get_camera_pcd_torch`, computed on the CPU pictures with NumPy.
+    '''
+    return pcd_from_pictures(camera.get_picture("Position"), camera.get_picture("Color"), camera.get_model_matrix(), crop_bbox, buffer)
 
 class Camera():
     def __init__(self, **kwags):
@@ -44,6 +142,14 @@ class Camera():
         self.pcd_crop = kwags.get('pcd_crop', False)
         self.pcd_down_sample_num = kwags.get('pcd_down_sample_num', 0)
         self.pcd_crop_bbox = kwags.get('bbox', [[-0.6, -0.35, 0.7401],[0.6, 0.35, 2]])
+        # "torch" works on the CUDA picture buffers, "numpy" on the CPU pictures, "auto" picks torch only when CUDA is available
+        self.pcd_backend = kwags.get('pcd_backend', 'auto')
+        if self.pcd_backend == 'auto':
+            self.pcd_backend = 'torch' if cuda_available() else 'numpy'
+        self.pcd_buffers = {}
+        # CPU sampler options: voxel size of the pre-reduction (0 disables it) and seed of the first point
+        self.pcd_voxel_size = kwags.get('pcd_voxel_size', 0.)
+        self.pcd_fps_seed = kwags.get('pcd_fps_seed', None)
 
         self.static_camera_config = []
         self.head_camera_type = kwags.get('head_camera_type', 'D435')
@@ -307,39 +413,31 @@ class Camera():
         # print(res)
         return res
 
+    def get_collect_cameras(self) -> dict:
+        '''
+            `{camera_name: camera}` of the cameras whose data is collected, wrist cameras first.
+        '''
+        res = {}
+        if self.collect_wrist_camera:
+            res['left_camera'] = self.left_camera
+            res['right_camera'] = self.right_camera
+        for camera, camera_name in zip(self.static_camera_list, self.static_camera_name):
+            if camera_name != 'head_camera' or self.collect_head_camera:
+                res[camera_name] = camera
+        return res
+
     # Get Camera RGBA
+    def get_camera_rgba(self, camera) -> np.ndarray:
+        return rgb_from_picture(camera.get_picture("Color"))
+
     def get_rgba(self) -> dict:
-        def _get_rgba(camera):
-            camera_rgba = camera.get_picture("Color")
-            camera_rgba_img = (camera_rgba * 255).clip(0, 255).astype("uint8")[:,:,:3]
-            return camera_rgba_img
-        
         # ================================= sensor camera =================================
         # def _get_sensor_rgba(sensor):
         #     camera_rgba = sensor.get_rgb()
         #     camera_rgba_img = (camera_rgba * 255).clip(0, 255).astype("uint8")[:,:,:3]
         #     return camera_rgba_img
-        
-        res = {}
-
-        if self.collect_wrist_camera:
-            res['left_camera'] = {}
-            res['right_camera'] = {}
-            res['left_camera']['rgb'] = _get_rgba(self.left_camera)
-            res['right_camera']['rgb'] = _get_rgba(self.right_camera)
-
-        for camera, camera_name in zip(self.static_camera_list, self.static_camera_name):
-            if camera_name == 'head_camera':
-                if self.collect_head_camera:
-                    res[camera_name]={}
-                    res[camera_name]['rgb'] = _get_rgba(camera)
-            else:
-                res[camera_name]={}
-                res[camera_name]['rgb'] = _get_rgba(camera)
-        # ================================= sensor camera =================================
         # res['head_sensor']['rgb'] = _get_sensor_rgba(self.head_sensor)
-
-        return res
+        return {camera_name: {'rgb': self.get_camera_rgba(camera)} for camera_name, camera in self.get_collect_cameras().items()}
     
     def get_obs_rgba(self) -> dict:
         self.observer_camera.take_picture()
@@ -351,159 +449,79 @@ class Camera():
         return _get_rgba(self.observer_camera)
     
     # Get Camera Segmentation
-    def get_segmentation(self, level = "mesh") -> dict:
-        def _get_segmentation(camera,level = "mesh"):
-            # visual_id is the unique id of each visual shape
-            seg_labels = camera.get_picture("Segmentation")  # [H, W, 4]
-            colormap = sorted(set(ImageColor.colormap.values()))
-            color_palette = np.array(
-                [ImageColor.getrgb(color) for color in colormap], dtype=np.uint8
-            )
-            if level == "mesh":
-                label0_image = seg_labels[..., 0].astype(np.uint8) # mesh-level
-            elif level == "actor":
-                label0_image = seg_labels[..., 1].astype(np.uint8) # actor-level
-            return color_palette[label0_image]
-        res = {
-            # 'left_camera':{},
-            # 'right_camera':{}
-        }
+    def get_camera_segmentation(self, camera, level = "mesh", as_id = False, id_dtype = np.uint16) -> np.ndarray:
+        return segmentation_from_picture(camera.get_picture("Segmentation"), level, as_id, id_dtype)
 
-        if self.collect_wrist_camera:
-            res['left_camera'] = {}
-            res['right_camera'] = {}
-            res['left_camera'][f'{level}_segmentation'] = _get_segmentation(self.left_camera, level=level)
-            res['right_camera'][f'{level}_segmentation'] = _get_segmentation(self.right_camera, level=level)
-        
-        for camera, camera_name in zip(self.static_camera_list, self.static_camera_name):
-            if camera_name == 'head_camera':
-                if self.collect_head_camera:
-                    res[camera_name]={}
-                    res[camera_name][f'{level}_segmentation'] = _get_segmentation(camera, level=level)
-            else:
-                res[camera_name]={}
-                res[camera_name][f'{level}_segmentation'] = _get_segmentation(camera, level=level)
-        return res
+    def get_segmentation(self, level = "mesh", as_id = False, id_dtype = np.uint16) -> dict:
+        return {
+            camera_name: {f'{level}_segmentation': self.get_camera_segmentation(camera, level, as_id, id_dtype)}
+            for camera_name, camera in self.get_collect_cameras().items()
+        }
 
     # Get Camera Depth
-    def get_depth(self)->dict:
-        def _get_depth(camera):
-            position = camera.get_picture("Position")
-            depth = -position[..., 2]
-            depth_image = (depth * 1000.0).astype(np.float64)
-            return depth_image
-        
-        def _get_sensor_depth(sensor):
-            depth = sensor.get_depth()
-            # pdb.set_trace()
-            # depth = -position[..., 2]
-            depth = (depth * 1000.0).astype(np.float64)
-            return depth
-        
-        res = {
-            # 'left_camera':{},
-            # 'right_camera':{},
-            # 'head_sensor':{}
-        }
-        
-        if self.collect_wrist_camera:
-            res['left_camera'] = {}
-            res['right_camera'] = {}
-            res['left_camera']['depth'] = _get_depth(self.left_camera)
-            res['right_camera']['depth'] = _get_depth(self.right_camera)
-        for camera, camera_name in zip(self.static_camera_list, self.static_camera_name):
-            if camera_name == 'head_camera':
-                if self.collect_head_camera:
-                    res[camera_name]={}
-                    res[camera_name]['depth'] = _get_depth(camera)
-            else:
-                res[camera_name]={}
-                res[camera_name]['depth'] = _get_depth(camera)
+    def get_camera_depth(self, camera, dtype = np.float64, scale = 1000.0) -> np.ndarray:
+        return depth_from_picture(camera.get_picture("Position"), dtype, scale)
+
+    def get_depth(self, dtype = np.float64, scale = 1000.0)->dict:
+        # def _get_sensor_depth(sensor):
+        #     depth = sensor.get_depth()
+        #     depth = (depth * 1000.0).astype(np.float64)
+        #     return depth
         # res['head_sensor']['depth'] = _get_sensor_depth(self.head_sensor)
-
-        return res
+        return {camera_name: {'depth': self.get_camera_depth(camera, dtype, scale)} for camera_name, camera in self.get_collect_cameras().items()}
     
+    def get_camera_pcd(self, camera, crop = True) -> np.ndarray:
+        '''
+            [N, 6] float32 world-frame xyz + rgb of a camera with the configured backend, cropped to `bbox` if `pcd_crop`.
+        '''
+        crop_bbox = self.pcd_crop_bbox if crop and self.pcd_crop else None
+        if self.pcd_backend == 'numpy':
+            return get_camera_pcd_numpy(camera, crop_bbox, self._get_pcd_buffer(camera))
+        return get_camera_pcd_torch(camera, crop_bbox)
+
+    def _get_pcd_buffer(self, camera) -> np.ndarray:
+        buffer = self.pcd_buffers.get(camera.get_name())
+        if buffer is None:
+            buffer = np.empty((camera.get_width() * camera.get_height(), 6), dtype=np.float32)
+            self.pcd_buffers[camera.get_name()] = buffer
+        return buffer
+
     # Get World PointCloud
     def get_world_pcd(self):
         self.world_camera1.take_picture()
         self.world_camera2.take_picture()
-        def _get_camera_pcd(camera, color = True):
-            rgba = camera.get_picture_cuda("Color").torch() # [H, W, 4]
-            position = camera.get_picture_cuda("Position").torch()
-            model_matrix = camera.get_model_matrix()
-
-            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            model_matrix = torch.tensor(model_matrix, dtype=torch.float32).to(device)
-
-            # Extract valid three-dimensional points and corresponding color data.
-            valid_mask = position[..., 3] < 1
-            points_opengl = position[..., :3][valid_mask]
-            points_color = rgba[valid_mask][:,:3]
-            # Transform into the world coordinate system.
-            points_world = torch.bmm(points_opengl.view(1, -1, 3), model_matrix[:3, :3].transpose(0,1).view(-1, 3, 3)).squeeze(1) + model_matrix[:3, 3]
-
-            # Format color data.
-            points_color = torch.clamp(points_color, 0, 1)
-            points_world = points_world.squeeze(0)
-
-            # Convert the tensor back to a NumPy array for use with Open3D.
-            points_world_np = points_world.cpu().numpy()
-            points_color_np = points_color.cpu().numpy()
-            # print(points_world_np.shape, points_color_np.shape)
-
-            res_pcd = np.hstack((points_world_np, points_color_np)) if color else points_world_np
-            return res_pcd
-
-        pcd1 = _get_camera_pcd(self.world_camera1, color = True)
-        pcd2 = _get_camera_pcd(self.world_camera2, color = True)
+        pcd1 = self.get_camera_pcd(self.world_camera1, crop = False)
+        pcd2 = self.get_camera_pcd(self.world_camera2, crop = False)
         res_pcd = np.vstack((pcd1, pcd2))
 
         return res_pcd
         pcd_array,index = fps(res_pcd[:,:3], 2000)
-        index = index.detach().cpu().numpy()[0]
 
         return pcd_array
         
-    # Get Camera PointCloud
-    def get_pcd(self, is_conbine = False):
-        def _get_camera_pcd(camera, point_num = 0):
-            rgba = camera.get_picture_cuda("Color").torch() # [H, W, 4]
-            position = camera.get_picture_cuda("Position").torch()
-            model_matrix = camera.get_model_matrix()
-
-            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            model_matrix = torch.tensor(model_matrix, dtype=torch.float32).to(device)
-
-            # Extract valid three-dimensional points and corresponding color data.
-            valid_mask = position[..., 3] < 1
-            points_opengl = position[..., :3][valid_mask]
-            points_color = rgba[valid_mask][:,:3]
-            # Transform into the world coordinate system.
-            points_world = torch.bmm(points_opengl.view(1, -1, 3), model_matrix[:3, :3].transpose(0,1).view(-1, 3, 3)).squeeze(1) + model_matrix[:3, 3]
-
-            # Format color data.
-            points_color = torch.clamp(points_color, 0, 1)
-
-            points_world = points_world.squeeze(0)
-            
-            # If crop is needed
-            if self.pcd_crop:
-                min_bound = torch.tensor(self.pcd_crop_bbox[0], dtype=torch.float32).to(device)
-                max_bound = torch.tensor(self.pcd_crop_bbox[1], dtype=torch.float32).to(device)
-                inside_bounds_mask = (points_world.squeeze(0) >= min_bound).all(dim=1) & (points_world.squeeze(0)  <= max_bound).all(dim=1)
-                points_world = points_world[inside_bounds_mask]
-                points_color = points_color[inside_bounds_mask]
-            
-            # Convert the tensor back to a NumPy array for use with Open3D.
-            points_world_np = points_world.cpu().numpy()
-            points_color_np = points_color.cpu().numpy()
+    def get_pcd_camera_names(self, is_conbine = False) -> list:
+        '''
+            Cameras the point cloud is built from: every collected camera if `is_conbine`, else the head camera.
+        '''
+        if is_conbine:
+            return list(self.get_collect_cameras().keys())
+        return ['head_camera'] if self.collect_head_camera else []
 
-            if point_num > 0:
-                # points_world_np,index = fps(points_world_np,point_num)
-                index = index.detach().cpu().numpy()[0]
-                points_color_np = points_color_np[index,:]
+    def sample_pcd(self, camera_pcds: list) -> np.ndarray:
+        '''
+            Merge per-camera point clouds and downsample them to `pcd_down_sample_num` points.
+        '''
+        if len(camera_pcds) == 0:
+            return np.array([])
+        conbine_pcd = np.vstack(camera_pcds)
+        if conbine_pcd.shape[0] == 0 or self.pcd_down_sample_num <= 0:
+            return conbine_pcd
+        pcd_array,index = fps(conbine_pcd[:,:3],self.pcd_down_sample_num, use_cuda=self.pcd_backend == 'torch',
+                              voxel_size=self.pcd_voxel_size, seed=self.pcd_fps_seed)
+        return conbine_pcd[index]
 
-            return np.hstack((points_world_np, points_color_np))
+    # Get Camera PointCloud
+    def get_pcd(self, is_conbine = False):
         if self.head_camera_id is None:
             print('No head camera in static camera list, pointcloud save error!')
             return None
@@ -512,28 +530,54 @@ class Camera():
         def _get_sensor_pcd(sensor):
             pass
         
-        conbine_pcd = np.array([])
-        # Merge pointcloud
-        if is_conbine:
-            # conbine_pcd = np.vstack((head_pcd , left_pcd , right_pcd, front_pcd))
-            if self.collect_wrist_camera:
-                conbine_pcd = np.vstack((_get_camera_pcd(self.left_camera), _get_camera_pcd(self.right_camera)))
-            for camera,camera_name in zip(self.static_camera_list, self.static_camera_name):
-                if camera_name == 'head_camera':
-                    if self.collect_head_camera:
-                        conbine_pcd = np.vstack((conbine_pcd, _get_camera_pcd(camera)))
-                else:
-                    conbine_pcd = np.vstack((conbine_pcd, _get_camera_pcd(camera)))
-        elif self.collect_head_camera:
-            conbine_pcd = _get_camera_pcd(self.static_camera_list[self.head_camera_id])
-        
-        if conbine_pcd.shape[0] == 0:
-            return conbine_pcd
-        
-        pcd_array,index = conbine_pcd[:,:3], np.array(range(len(conbine_pcd)))
-
-        if self.pcd_down_sample_num > 0:
-            pcd_array,index = fps(conbine_pcd[:,:3],self.pcd_down_sample_num)
-            index = index.detach().cpu().numpy()[0]
+        cameras = self.get_collect_cameras()
+        return self.sample_pcd([self.get_camera_pcd(cameras[camera_name]) for camera_name in self.get_pcd_camera_names(is_conbine)])
 
-        return conbine_pcd[index]
\ No newline at end of file
+    def capture(self, modalities = ('rgb',), is_conbine = False, depth_dtype = np.float64, depth_scale = 1000.0,
+                seg_as_id = False, seg_dtype = np.uint16) -> dict:
+        '''
+            All requested modalities of all collected cameras from one readback per camera per render target.
+                - `modalities`: any of "rgb", "depth", "mesh_segmentation", "actor_segmentation", "pointcloud".
+                - Color, Position and Segmentation are each read once per camera and shared by RGB, depth,
+                  segmentation and (on the numpy backend) the point cloud.
+                - Returns `{"cameras": {camera_name: {modality: array}}, "pointcloud": merged point cloud}`,
+                  the pictures must have been taken with `update_picture`.
+        '''
+        modalities = set(modalities)
+        pcd_camera_names = self.get_pcd_camera_names(is_conbine) if 'pointcloud' in modalities else []
+        crop_bbox = self.pcd_crop_bbox if self.pcd_crop else None
+        res = {"cameras": {}, "pointcloud": None}
+        camera_pcds = []
+        for camera_name, camera in self.get_collect_cameras().items():
+            cpu_pcd = camera_name in pcd_camera_names and self.pcd_backend == 'numpy'
+            targets = set()
+            if 'rgb' in modalities or cpu_pcd:
+                targets.add("Color")
+            if 'depth' in modalities or cpu_pcd:
+                targets.add("Position")
+            if 'mesh_segmentation' in modalities or 'actor_segmentation' in modalities:
+                targets.add("Segmentation")
+            pictures = {target: camera.get_picture(target) for target in targets}
+
+            camera_res = {}
+            if 'rgb' in modalities:
+                camera_res['rgb'] = rgb_from_picture(pictures["Color"])
+            for level in ['mesh', 'actor']:
+                if f'{level}_segmentation' in modalities:
+                    camera_res[f'{level}_segmentation'] = segmentation_from_picture(pictures["Segmentation"], level, seg_as_id, seg_dtype)
+            if 'depth' in modalities:
+                camera_res['depth'] = depth_from_picture(pictures["Position"], depth_dtype, depth_scale)
+            res["cameras"][camera_name] = camera_res
+
+            if cpu_pcd:
+                camera_pcds.append(pcd_from_pictures(pictures["Position"], pictures["Color"], camera.get_model_matrix(),
+                                                     crop_bbox, self._get_pcd_buffer(camera)))
+            elif camera_name in pcd_camera_names:
+                camera_pcds.append(get_camera_pcd_torch(camera, crop_bbox))
+
+        if 'pointcloud' in modalities:
+            if self.head_camera_id is None:
+                print('No head camera in static camera list, pointcloud save error!')
+            else:
+                res["pointcloud"] = self.sample_pcd(camera_pcds)
+        return res
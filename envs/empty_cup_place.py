@@ -24,16 +24,28 @@ class empty_cup_place(Base_task):
     def load_actors(self):
         tag = np.random.randint(0,2)
         if tag==0:
-            self.cup,self.cup_data = rand_create_glb(
-                self.scene,
+            cup_pose = rand_pose(
                 xlim=[0.15,0.3],
                 ylim=[-0.2,0.05],
                 zlim=[0.8],
-                modelname="022_cup",
                 rotate_rand=False,
                 qpos=[0.5,0.5,0.5,0.5],
             )
+            while not self.is_reachable(cup_pose.p, arm_tag='right'):
+                cup_pose = rand_pose(
+                    xlim=[0.15,0.3],
+                    ylim=[-0.2,0.05],
+                    zlim=[0.8],
+                    rotate_rand=False,
+                    qpos=[0.5,0.5,0.5,0.5],
+                )
+            self.cup,self.cup_data = create_glb(
+                self.scene,
+                pose = cup_pose,
+                modelname="022_cup",
+            )
             cup_pose = self.cup.get_pose().p
+            self.add_table_object(cup_pose.tolist(), 0.08)
 
             coaster_pose = rand_pose(
                 xlim=[-0.05,0.1],
@@ -43,7 +55,8 @@ class empty_cup_place(Base_task):
                 qpos=[0.5,0.5,0.5,0.5],
             )
 
-            while np.sum(pow(cup_pose[:2] - coaster_pose.p[:2],2)) < 0.01:
+            # the coaster center stays 0.1 away from the cup center: its 0.02 disc must not touch the cup's 0.08 one
+            while not self.table_occupancy.is_free(coaster_pose.p[0], coaster_pose.p[1], 0.02):
                 coaster_pose = rand_pose(
                     xlim=[-0.05,0.1],
                     ylim=[-0.2,0.05],
@@ -58,16 +71,28 @@ class empty_cup_place(Base_task):
                 convex=True
             )
         else:
-            self.cup,self.cup_data = rand_create_glb(
-                self.scene,
+            cup_pose = rand_pose(
                 xlim=[-0.3,-0.15],
                 ylim=[-0.2,0.05],
                 zlim=[0.8],
-                modelname="022_cup",
                 rotate_rand=False,
                 qpos=[0.5,0.5,0.5,0.5],
             )
+            while not self.is_reachable(cup_pose.p, arm_tag='left'):
+                cup_pose = rand_pose(
+                    xlim=[-0.3,-0.15],
+                    ylim=[-0.2,0.05],
+                    zlim=[0.8],
+                    rotate_rand=False,
+                    qpos=[0.5,0.5,0.5,0.5],
+                )
+            self.cup,self.cup_data = create_glb(
+                self.scene,
+                pose = cup_pose,
+                modelname="022_cup",
+            )
             cup_pose = self.cup.get_pose().p
+            self.add_table_object(cup_pose.tolist(), 0.08)
 
             coaster_pose = rand_pose(
                 xlim=[-0.1, 0.05],
@@ -77,7 +102,8 @@ class empty_cup_place(Base_task):
                 qpos=[0.5,0.5,0.5,0.5],
             )
 
-            while np.sum(pow(cup_pose[:2] - coaster_pose.p[:2],2)) < 0.01:
+            # the coaster center stays 0.1 away from the cup center: its 0.02 disc must not touch the cup's 0.08 one
+            while not self.table_occupancy.is_free(coaster_pose.p[0], coaster_pose.p[1], 0.02):
                 coaster_pose = rand_pose(
                     xlim=[-0.1, 0.05],
                     ylim=[-0.2,0.05],
@@ -95,12 +121,7 @@ class empty_cup_place(Base_task):
         self.cup.find_component_by_type(sapien.physx.PhysxRigidDynamicComponent).mass = 0.01
         self.coaster.find_component_by_type(sapien.physx.PhysxRigidDynamicComponent).mass = 0.01
 
-        pose = sapien.core.pysapien.Entity.get_pose(self.cup).p.tolist()
-        pose.append(0.08)
-        self.size_dict.append(pose)
-        pose = sapien.core.pysapien.Entity.get_pose(self.coaster).p.tolist()
-        pose.append(0.1)
-        self.size_dict.append(pose)
+        self.add_table_object(self.coaster.get_pose().p.tolist(), 0.1)
 
     def play_once(self):
         # Get the current pose of the cup
@@ -124,6 +145,10 @@ class empty_cup_place(Base_task):
         pre_grasp_pose = self.get_grasp_pose_w_labeled_direction(actor=self.cup, actor_data=self.cup_data, pre_dis=0.1, contact_point_id = contant_id)
         target_grasp_pose = self.get_grasp_pose_w_labeled_direction(actor=self.cup, actor_data=self.cup_data, pre_dis=0., contact_point_id = contant_id)
 
+        lift_pose = target_grasp_pose.copy()
+        lift_pose[2] += 0.1  # Lift the cup by 0.1 meters
+        self.queue_moves(arm_tag, [pre_grasp_pose, target_grasp_pose, lift_pose])
+
         # Move to the pre-grasp pose
         move_function(pre_grasp_pose)
         open_gripper_function(0.85)
@@ -133,8 +158,6 @@ class empty_cup_place(Base_task):
         close_gripper_function()  # Tighten the gripper to ensure a secure grasp
 
         # Lift the cup slightly
-        lift_pose = target_grasp_pose.copy()
-        lift_pose[2] += 0.1  # Lift the cup by 0.1 meters
         move_function(lift_pose)
 
         # Get the target pose for placing the cup on the coaster
@@ -142,6 +165,10 @@ class empty_cup_place(Base_task):
         place_pose = self.get_grasp_pose_from_goal_point_and_direction(actor=self.cup, actor_data=self.cup_data, endpose_tag=arm_tag, actor_functional_point_id=0, target_point=coaster_pose, target_approach_direction=[0,0.707,0.707,0], pre_dis=0.05)
         target_place_pose = self.get_grasp_pose_from_goal_point_and_direction(actor=self.cup, actor_data=self.cup_data, endpose_tag=arm_tag, actor_functional_point_id=0, target_point=coaster_pose, target_approach_direction=[0,0.707,0.707,0], pre_dis=0)
 
+        lift_pose = target_place_pose.copy()
+        lift_pose[2] += 0.1  # Lift the arm by 0.1 meters
+        self.queue_moves(arm_tag, [place_pose, target_place_pose, lift_pose])
+
         # Move to the pre-place pose
         move_function(place_pose)
 
@@ -150,8 +177,6 @@ class empty_cup_place(Base_task):
         open_gripper_function(0.85)
 
         # Lift the arm slightly after placing the cup
-        lift_pose = target_place_pose.copy()
-        lift_pose[2] += 0.1  # Lift the arm by 0.1 meters
         move_function(lift_pose)
 
         info = dict()
@@ -0,0 +1,260 @@
+import time
+import atexit
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+def _plan_worker(conn, spec):
+    '''
+        Worker process of one arm: rebuilds the planner from its spec once, then serves plan requests until `None`.
+            A request names its method: "path" (`plan_path`), "rrt" (one `plan_pose` attempt) or "screw" (`plan_screw`).
+    '''
+    from .planner import MplibPlanner
+    import sapien.core as sapien
+    planner = MplibPlanner.from_spec(spec)
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, now_qpos, target_p, target_q, use_point_cloud, use_attach, arms_tag = request
+        try:
+            target_pose = sapien.Pose(target_p, target_q)
+            if method == 'rrt':
+                result = planner.plan_pose(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, try_times=2, log=False)
+            elif method == 'screw':
+                result = planner.plan_screw(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, log=False)
+            else:
+                result = planner.plan_path(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag=arms_tag)
+            conn.send((result, None))
+        except Exception:
+            conn.send((None, traceback.format_exc()))
+    conn.close()
+
+class PlanFuture():
+    '''
+        Pending plan of one worker, `result()` waits for it. The reply is received once and kept.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+        self.done = False
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        if not self.done:
+            try:
+                self.value, self.error = self.conn.recv()
+            except (EOFError, OSError):
+                self.value, self.error = None, 'the plan worker exited before replying'
+            self.done = True
+
+    def result(self) -> dict:
+        self.wait()
+        if self.error is not None:
+            raise RuntimeError('planning in the plan worker failed:\n' + self.error)
+        return self.value
+
+class PlanWorkerPool():
+    '''
+        One planning process per arm, so the two arms of a dual-arm move are planned at the same time.
+            - The mplib planners hold the GIL while planning, threads would not overlap, so each arm gets its own process
+              (spawned, the SAPIEN scene is never forked) with a planner rebuilt from `MplibPlanner.spec`.
+            - The planner of a worker only knows the robot, as the planners built with `set_planner()` without a scene.
+            - `submit` sends a request and returns at once, `PlanFuture.result()` waits for the reply.
+              A worker serves its requests in order, an unread reply is drained before the next request of that arm.
+            - `cancel` drops a plan that is no longer needed, a worker still planning it is restarted
+              so the next request of the arm does not wait for it.
+            - A worker that died is restarted by the next `submit` of its arm.
+    '''
+    def __init__(self, specs: dict):
+        self.specs = specs
+        self.conns = {}
+        self.processes = {}
+        self.pending = {}
+        for arm_tag in specs:
+            self._start_worker(arm_tag)
+
+    def _start_worker(self, arm_tag):
+        ctx = mp.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_plan_worker, args=(child_conn, self.specs[arm_tag]), name=f'plan_worker_{arm_tag}', daemon=True)
+        process.start()
+        child_conn.close()
+        self.conns[arm_tag] = parent_conn
+        self.processes[arm_tag] = process
+        self.pending[arm_tag] = None
+
+    def cancel(self, arm_tag, future):
+        '''
+            Drop `future` of `arm_tag`: drained if its reply is already there, otherwise the worker is restarted.
+        '''
+        if future is not self.pending[arm_tag] or future.done:
+            return
+        if self.conns[arm_tag].poll():
+            future.wait()
+            return
+        self.processes[arm_tag].terminate()
+        self.processes[arm_tag].join()
+        self.conns[arm_tag].close()
+        self._start_worker(arm_tag)
+
+    def submit(self, arm_tag, now_qpos, target_pose, use_point_cloud=False, use_attach=False) -> PlanFuture:
+        '''
+            Plan `arm_tag` from `now_qpos` to `target_pose` (a `sapien.Pose` of the planner, as `Robot._trans_target_pose` returns).
+        '''
+        if self.pending[arm_tag] is not None:
+            self.pending[arm_tag].wait()
+        if not self.processes[arm_tag].is_alive():
+            print(f'\nplan worker of the {arm_tag} arm exited with code {self.processes[arm_tag].exitcode}, restarting')
+            self.conns[arm_tag].close()
+            self._start_worker(arm_tag)
+        self.conns[arm_tag].send(('path', list(now_qpos), target_pose.p.tolist(), target_pose.q.tolist(),
+                                  use_point_cloud, use_attach, arm_tag))
+        self.pending[arm_tag] = PlanFuture(self.conns[arm_tag])
+        return self.pending[arm_tag]
+
+    def is_alive(self) -> bool:
+        return len(self.processes) > 0 and all(process.is_alive() for process in self.processes.values())
+
+    def close(self):
+        for arm_tag, conn in self.conns.items():
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.conns = {}
+        self.processes = {}
+
+class PortfolioPool():
+    '''
+        Worker processes of one `mplib_portfolio` planner, racing planning strategies on the same request.
+            - `race` sends one strategy to each worker and returns the first success, or the success with the fewest
+              steps among those that arrive within the grace window after it.
+            - mplib cannot interrupt a running plan, so the attempts still running when the race is decided are cancelled
+              by terminating their workers, which are respawned at once and rebuild their planner in the background.
+            - A worker that died is respawned, during the race it died in or before the next race.
+            - mplib has no seed API, the RRT attempts differ through the OMPL random state of each worker process.
+    '''
+    def __init__(self, spec, worker_num):
+        self.spec = spec
+        self.conns = [None] * worker_num
+        self.processes = [None] * worker_num
+        for i in range(worker_num):
+            self._start_worker(i)
+
+    def _start_worker(self, i):
+        ctx = mp.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_plan_worker, args=(child_conn, self.spec), name=f'portfolio_worker_{i}', daemon=True)
+        process.start()
+        child_conn.close()
+        self.conns[i] = parent_conn
+        self.processes[i] = process
+
+    def _cancel(self, i):
+        self.processes[i].terminate()
+        self._restart_worker(i)
+
+    def _restart_worker(self, i):
+        self.processes[i].join()
+        self.conns[i].close()
+        self._start_worker(i)
+
+    def race(self, now_qpos, target_pose, strategies, grace, arms_tag = None):
+        '''
+            Run `strategies` ("rrt" or "screw", the first ones are kept if there are fewer workers) at the same time.
+            Returns (strategy, result, attempt number), strategy is None and result the last failure if every attempt failed.
+        '''
+        running = {}
+        for i, strategy in zip(range(len(self.conns)), strategies):
+            if not self.processes[i].is_alive():
+                print(f'\nportfolio worker {i} exited with code {self.processes[i].exitcode}, restarting')
+                self._restart_worker(i)
+            self.conns[i].send((strategy, list(now_qpos), target_pose.p.tolist(), target_pose.q.tolist(),
+                                False, False, arms_tag))
+            running[self.conns[i]] = (i, strategy)
+        attempt_num = len(running)
+
+        best, last_result, deadline = None, None, None
+        try:
+            while running:
+                timeout = None if deadline is None else max(0., deadline - time.perf_counter())
+                ready = wait(list(running), timeout)
+                if len(ready) == 0:
+                    break
+                for conn in ready:
+                    i, strategy = running.pop(conn)
+                    try:
+                        result, error = conn.recv()
+                    except EOFError:
+                        self._restart_worker(i)
+                        error = f'portfolio worker {i} exited'
+                    if error is not None:
+                        raise RuntimeError('planning in the portfolio worker failed:\n' + error)
+                    last_result = result
+                    if result['status'] != 'Success':
+                        continue
+                    if best is None or result['position'].shape[0] < best[1]['position'].shape[0]:
+                        best = (strategy, result)
+                    if deadline is None:
+                        deadline = time.perf_counter() + grace
+        finally:
+            for i, _ in running.values():
+                self._cancel(i)
+        if best is None:
+            return None, last_result, attempt_num
+        return best[0], best[1], attempt_num
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.conns = []
+        self.processes = []
+
+# portfolio pools of this process, keyed by the planner spec
+_portfolio_pools = {}
+
+def get_portfolio_pool(spec, worker_num) -> PortfolioPool:
+    key = (repr(sorted(spec.items())), worker_num)
+    if key not in _portfolio_pools:
+        _portfolio_pools[key] = PortfolioPool(spec, worker_num)
+    return _portfolio_pools[key]
+
+def can_start_workers() -> bool:
+    '''
+        Daemon processes (the workers of `EpisodeFarm`) are not allowed to have children.
+    '''
+    return not mp.current_process().daemon
+
+# pools of this process, keyed by the planner specs, kept across episodes
+_plan_pools = {}
+
+def get_plan_pool(specs: dict) -> PlanWorkerPool:
+    '''
+        Plan worker pool of the planners of `specs` ({arm_tag: spec}), started on first use.
+    '''
+    key = repr(sorted(specs.items()))
+    if key in _plan_pools and not _plan_pools[key].is_alive():
+        _plan_pools.pop(key).close()
+    if key not in _plan_pools:
+        _plan_pools[key] = PlanWorkerPool(specs)
+    return _plan_pools[key]
+
+def close_plan_pools():
+    for pool in list(_plan_pools.values()) + list(_portfolio_pools.values()):
+        pool.close()
+    _plan_pools.clear()
+    _portfolio_pools.clear()
+
+atexit.register(close_plan_pools)
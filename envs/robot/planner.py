@@ -4,8 +4,18 @@ import numpy as np
 import pdb
 import numpy as np
 import toppra as ta
+from collections import deque, Counter
 from mplib.sapien_utils import SapienPlanner, SapienPlanningWorld
 
+# `mplib_portfolio`: RRT attempts raced with the screw plan, and rounds of them before the plan fails
+PORTFOLIO_RRT_NUM = 3
+PORTFOLIO_MAX_ATTEMPTS = 9
+# after the first success, wait this long (s) for a shorter one
+PORTFOLIO_GRACE = 0.05
+# winners of the last calls, once screw wins this share of them it is tried alone first
+PORTFOLIO_WINDOW = 20
+PORTFOLIO_SCREW_FIRST = 0.5
+
 class MplibPlanner():
     # links=None, joints=None
     def __init__(self, urdf_path, srdf_path, move_group, robot_origion_pose, robot_entity, planner_type = 'mplib_RRT', scene = None):
@@ -15,7 +25,18 @@ class MplibPlanner():
         links = [link.get_name() for link in robot_entity.get_links()]
         joints = [joint.get_name() for joint in robot_entity.get_active_joints()]
 
+        # everything needed to rebuild this planner in another process, see `from_spec`
+        self.spec = None
         if scene is None:
+            self.spec = {
+                "urdf_path": urdf_path,
+                "srdf_path": srdf_path,
+                "move_group": move_group,
+                "robot_origion_pose": [robot_origion_pose.p.tolist(), robot_origion_pose.q.tolist()],
+                "links": links,
+                "joints": joints,
+                "planner_type": planner_type,
+            }
             self.planner = mplib.Planner(
                 urdf = urdf_path,
                 srdf = srdf_path,
@@ -43,7 +64,43 @@ class MplibPlanner():
 
         self.plan_step_lim = 2500
         self.TOPP = self.planner.TOPP
+        # `PlanCache` of `plan_path`, set by `Robot.set_plan_cache`
+        self.plan_cache = None
+        # bumped whenever the collision world changes, cached plans of older versions are not reused
+        self.world_version = 0
+        self._init_portfolio()
     
+    @classmethod
+    def from_spec(cls, spec):
+        '''
+            Planner of `spec` (`self.spec` of a planner built without a scene), without the SAPIEN robot entity.
+        '''
+        import sapien.core as sapien
+        planner = cls.__new__(cls)
+        ta.setup_logging("CRITICAL") # hide logging
+        planner.spec = spec
+        planner.planner = mplib.Planner(
+            urdf = spec['urdf_path'],
+            srdf = spec['srdf_path'],
+            move_group = spec['move_group'],
+            user_link_names=spec['links'],
+            user_joint_names=spec['joints'],
+            use_convex=False
+        )
+        planner.planner.set_base_pose(sapien.Pose(*spec['robot_origion_pose']))
+        planner.planner_type = spec['planner_type']
+        planner.plan_step_lim = 2500
+        planner.TOPP = planner.planner.TOPP
+        planner.plan_cache = None
+        planner.world_version = 0
+        planner._init_portfolio()
+        return planner
+
+    def _init_portfolio(self):
+        self.portfolio = None
+        self.portfolio_wins = deque(maxlen=PORTFOLIO_WINDOW)
+        self.portfolio_stats = Counter()
+
     def show_info(self):
         print('joint_limits', self.planner.joint_limits)
         print('joint_acc_limits', self.planner.joint_acc_limits)
@@ -113,13 +170,90 @@ class MplibPlanner():
         Interpolative planning with screw motion.
         Will not avoid collision and will fail if the path contains collision.
         """
+        result = self.get_cached_plan(now_qpos, target_pose)
+        if result is not None:
+            return result
+
         if self.planner_type == 'mplib_RRT':
             result = self.plan_pose(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, try_times=10, log = log)
         elif self.planner_type == 'mplib_screw':
             result = self.plan_screw(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, log)
+        elif self.planner_type == 'mplib_portfolio':
+            result = self.plan_portfolio(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, log)
         
+        return self.cache_plan(now_qpos, target_pose, result)
+
+    def plan_portfolio(self, now_qpos, target_pose, use_point_cloud=False, use_attach=False, arms_tag = None, log = True):
+        '''
+            Race `plan_screw` and PORTFOLIO_RRT_NUM single `plan_pose` attempts in worker processes, the first success wins
+            (or the shortest success within PORTFOLIO_GRACE). Failed rounds are raced again with RRT attempts only,
+            until PORTFOLIO_MAX_ATTEMPTS attempts ran, the same budget as `mplib_RRT`.
+                - The winning strategy is kept in `result['strategy']` and counted in `portfolio_stats`.
+                - Adaptive: when screw won PORTFOLIO_SCREW_FIRST of the last PORTFOLIO_WINDOW calls, it is tried alone first
+                  and the race only runs if it fails.
+                - Planners built with a scene cannot be rebuilt in the workers and plan as `mplib_RRT`, as do planners in
+                  daemon processes (`EpisodeFarm` workers), which cannot start workers.
+        '''
+        from .plan_pool import get_portfolio_pool, can_start_workers
+        if self.spec is None or use_point_cloud or not can_start_workers():
+            return self.plan_pose(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, try_times=10, log = log)
+        if self.portfolio is None:
+            self.portfolio = get_portfolio_pool(self.spec, PORTFOLIO_RRT_NUM + 1)
+
+        strategies = ['screw'] + ['rrt'] * PORTFOLIO_RRT_NUM
+        if len(self.portfolio_wins) >= PORTFOLIO_WINDOW // 4 and \
+                self.portfolio_wins.count('screw') >= PORTFOLIO_SCREW_FIRST * len(self.portfolio_wins):
+            result = self.plan_screw(now_qpos, target_pose, use_point_cloud, use_attach, arms_tag, log = False)
+            strategies = strategies[1:]
+            if result['status'] == 'Success':
+                return self._portfolio_result('screw', result)
+
+        attempt_num = 0
+        while attempt_num < PORTFOLIO_MAX_ATTEMPTS:
+            strategy, result, round_attempt_num = self.portfolio.race(np.array(now_qpos), target_pose, strategies, PORTFOLIO_GRACE, arms_tag)
+            if strategy is not None:
+                return self._portfolio_result(strategy, result)
+            attempt_num += round_attempt_num
+            strategies = ['rrt'] * min(PORTFOLIO_RRT_NUM, PORTFOLIO_MAX_ATTEMPTS - attempt_num)
+            if round_attempt_num == 0:
+                break
+
+        if log:
+            print(f"\n {arms_tag} arm palnning failed ({result['status'] if result is not None else 'Fail'}) !")
+        return self._portfolio_result(None, result if result is not None else {'status': 'Fail'})
+
+    def _portfolio_result(self, strategy, result):
+        strategy = strategy if strategy is not None else 'fail'
+        self.portfolio_wins.append(strategy)
+        self.portfolio_stats[strategy] += 1
+        result['strategy'] = strategy
+        return result
+
+    def get_cached_plan(self, now_qpos, target_pose):
+        '''
+            Plan of the plan cache from `now_qpos` to `target_pose`, None without a cache or on a miss.
+        '''
+        if self.plan_cache is None:
+            return None
+        return self.plan_cache.get(self.planner_type, self.world_version, now_qpos, target_pose,
+                                   self.planner.move_group_joint_indices)
+
+    def cache_plan(self, now_qpos, target_pose, result):
+        if self.plan_cache is not None:
+            self.plan_cache.put(self.planner_type, self.world_version, now_qpos, target_pose, result)
         return result
+
+    def update_point_cloud(self, points, resolution = 1e-3):
+        self.planner.update_point_cloud(points, resolution=resolution)
+        self.world_version += 1
     
+    def check_ik(self, now_qpos, target_pose, n_init_qpos = 10) -> bool:
+        '''
+            Whether `target_pose` has a collision-free IK solution, without planning a path to it.
+        '''
+        status, _ = self.planner.IK(target_pose, np.array(now_qpos), n_init_qpos=n_init_qpos)
+        return status == "Success"
+
     def plan_grippers(self, now_val, target_val):
         step_n = 200
         dis_val = target_val - now_val
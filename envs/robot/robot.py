@@ -2,6 +2,7 @@ import sapien.core as sapien
 import numpy as np
 import pdb
 from .planner import MplibPlanner
+from ..utils.plan_cache import get_plan_cache, PLAN_CACHE_SIZE
 import numpy as np
 import toppra as ta
 import math
@@ -215,6 +216,35 @@ class Robot():
         print('left ee: ', self.left_ee.get_name())
         print('right ee: ', self.right_ee.get_name())
 
+    def reset(self):
+        '''
+            Per-episode state of a robot kept across episodes (reset-in-place): joint states, joint drive properties,
+            and new planners, so no attached object, point cloud or world version of the previous episode is left.
+        '''
+        self.left_js = None
+        self.right_js = None
+        self.init_joints()
+        self.set_planner()
+
+    def get_drive_state(self) -> dict:
+        '''
+            Drive targets and gripper values, the robot state that is not part of the articulation qpos.
+        '''
+        return {
+            "left_drive_target": np.array([joint.get_drive_target()[0] for joint in self.left_active_joints]),
+            "right_drive_target": np.array([joint.get_drive_target()[0] for joint in self.right_active_joints]),
+            "left_gripper_val": self.left_gripper_val,
+            "right_gripper_val": self.right_gripper_val,
+        }
+
+    def set_drive_state(self, state: dict):
+        for joint, target in zip(self.left_active_joints, state['left_drive_target']):
+            joint.set_drive_target(target)
+        for joint, target in zip(self.right_active_joints, state['right_drive_target']):
+            joint.set_drive_target(target)
+        self.left_gripper_val = state['left_gripper_val']
+        self.right_gripper_val = state['right_gripper_val']
+
     # self.urdf_path = './assets/embodiments/panda/panda.urdf'
     # self.srdf_path = './assets/embodiments/panda/panda.srdf'
     # self.move_group = 
@@ -232,6 +262,30 @@ class Robot():
                                           self.right_move_group, self.right_entity_origion_pose, 
                                           self.right_entity, self.right_planner_type, scene)
         #self.planner = MplibPlanner(self.)
+
+    def set_plan_cache(self, max_size = PLAN_CACHE_SIZE):
+        '''
+            Memoize the arm plans of both planners, planners built with a scene are not cached.
+        '''
+        for planner in (self.left_planner, self.right_planner):
+            if planner.spec is not None:
+                planner.plan_cache = get_plan_cache(planner.spec, max_size)
+
+    def save_plan_cache(self):
+        for planner in (self.left_planner, self.right_planner):
+            if planner.plan_cache is not None:
+                planner.plan_cache.save()
+
+    def get_plan_specs(self) -> dict:
+        '''
+            {arm_tag: planner spec} for the plan worker pool, None if a planner cannot be rebuilt in another process.
+            Portfolio planners already plan in their own worker processes, and daemon workers cannot start more.
+        '''
+        if self.left_planner.spec is None or self.right_planner.spec is None:
+            return None
+        if 'mplib_portfolio' in (self.left_planner_type, self.right_planner_type):
+            return None
+        return {'left': self.left_planner.spec, 'right': self.right_planner.spec}
     
     def update_world_pcd(self, world_pcd):
         try:
@@ -255,6 +309,14 @@ class Robot():
         target_pose_arr[-4:] = deepcopy(target_pose_quat)
         return sapien.Pose(target_pose_arr[:3], target_pose_arr[-4:])
 
+    def check_reachable(self, target_pose, arm_tag):
+        '''
+            Whether the arm has an IK solution for the endpose `target_pose`, the same pose `*_plan_path` takes.
+        '''
+        planner = self.left_planner if arm_tag == 'left' else self.right_planner
+        entity = self.left_entity if arm_tag == 'left' else self.right_entity
+        return planner.check_ik(entity.get_qpos(), self._trans_target_pose(target_pose, arm_tag=arm_tag))
+
     def left_plan_path(self, target_pose, use_point_cloud=False, use_attach=False):
         # now_qpos = self.get_left_arm_jointState()[:-1]
         now_qpos = self.left_entity.get_qpos()
@@ -1,7 +1,21 @@
+from .lazy_import import *
+from .asset_registry import *
+from .convex_cache import *
 from .create_actor import *
 from .rand_create_actor import *
 from .save_file import *
+from .episode_store import *
+from .async_saver import *
+from .episode_manifest import *
+from .traj_cache import *
+from .plan_cache import *
+from .scene_state import *
+from .lazy_obs import *
+from .video_stream import *
 from .farthest_point_sampler import *
+from .table_occupancy import *
+from .reachability import *
 from .rand_create_messy_actor import *
 from .get_camera_config import *
+from .render_profile import *
 from .transforms import *
\ No newline at end of file
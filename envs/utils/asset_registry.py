@@ -0,0 +1,152 @@
+import os
+import json
+from copy import deepcopy
+from collections import OrderedDict
+
+ASSET_DIR = "./assets/objects/"
+# entries kept per cache, the least recently used one is evicted first
+ASSET_CACHE_SIZE = 256
+
+class LRUCache():
+    '''
+        Bounded mapping that evicts its least recently used entry, with hit / miss counters.
+    '''
+    def __init__(self, max_size = ASSET_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hit_num = 0
+        self.miss_num = 0
+        self.evict_num = 0
+
+    def get(self, key, load_func):
+        '''
+            Return the entry of `key`, calling `load_func()` to create it on a miss.
+        '''
+        value = self.lookup(key)
+        if value is None:
+            value = load_func()
+            self.put(key, value)
+        return value
+
+    def lookup(self, key):
+        '''
+            Return the entry of `key`, None on a miss.
+        '''
+        if key in self.entries:
+            self.hit_num += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.miss_num += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.shrink()
+
+    def shrink(self):
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evict_num += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        query_num = self.hit_num + self.miss_num
+        return {
+            "size": len(self.entries),
+            "hit_num": self.hit_num,
+            "miss_num": self.miss_num,
+            "evict_num": self.evict_num,
+            "hit_rate": self.hit_num / query_num if query_num > 0 else 0.,
+        }
+
+def _load_json(json_file_path):
+    try:
+        with open(json_file_path, 'r') as file:
+            return json.load(file)
+    except:
+        return None
+
+def get_glb_or_obj_file(modeldir, model_id):
+    if model_id is None:
+        file = modeldir + "base.glb"
+    else:
+        file = modeldir + f"base{model_id}.glb"
+    if not os.path.exists(file):
+        if model_id is None:
+            file = modeldir + "textured.obj"
+        else:
+            file = modeldir + f"textured{model_id}.obj"
+    return file
+
+def _find_model_files(modelname, model_id):
+    modeldir = ASSET_DIR + modelname + "/"
+    collision_file = ""
+    visual_file = ""
+    if os.path.exists(modeldir + "collision/"):
+        collision_file = get_glb_or_obj_file(modeldir + 'collision/', model_id)
+    if not os.path.exists(collision_file):
+        collision_file = get_glb_or_obj_file(modeldir, model_id)
+    if os.path.exists(modeldir + "visual/"):
+        visual_file = get_glb_or_obj_file(modeldir + 'visual/', model_id)
+    if not os.path.exists(visual_file):
+        visual_file = get_glb_or_obj_file(modeldir, model_id)
+    if not os.path.exists(collision_file) or not os.path.exists(visual_file):
+        return None, None
+    return collision_file, visual_file
+
+class AssetRegistry():
+    '''
+        Process-wide cache of what `create_actor` and friends read from `./assets/objects/` for every actor.
+            - `model_data`: parsed `model_data{id}.json`, keyed by path. Callers get a copy, so they may edit it.
+            - `files`: resolved (collision, visual) mesh paths of a (model, model_id).
+            - `builders`: configured actor builders, keyed by (model, model_id, scale, convex, is_static, ...).
+              A builder only records which meshes to load, so it is rebound to the current scene on every build.
+        Every cache is an LRU of `max_size` entries, `get_stats()` reports the hits, misses and evictions of each.
+    '''
+    def __init__(self, max_size = ASSET_CACHE_SIZE):
+        self.model_data = LRUCache(max_size)
+        self.files = LRUCache(max_size)
+        self.builders = LRUCache(max_size)
+
+    def set_max_size(self, max_size):
+        for cache in (self.model_data, self.files, self.builders):
+            cache.max_size = max_size
+            cache.shrink()
+
+    def get_model_data(self, json_file_path):
+        model_data = self.model_data.get(os.path.normpath(json_file_path), lambda: _load_json(json_file_path))
+        return deepcopy(model_data)
+
+    def get_model_files(self, modelname, model_id = None):
+        '''
+            (collision file, visual file) of a model, `collision/` and `visual/` sub-directories first,
+            `base.glb` before `textured.obj`. (None, None) if a file is missing.
+        '''
+        return self.files.get((modelname, model_id), lambda: _find_model_files(modelname, model_id))
+
+    def build(self, scene, key, make_builder, name = ""):
+        '''
+            Build an entity from the cached builder of `key`, `make_builder(scene)` creates it on a miss.
+        '''
+        builder = self.builders.get(key, lambda: make_builder(scene))
+        builder.set_scene(scene)
+        entity = builder.build(name=name)
+        # do not keep the scene alive through the cache
+        builder.scene = None
+        return entity
+
+    def clear(self):
+        for cache in (self.model_data, self.files, self.builders):
+            cache.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "model_data": self.model_data.get_stats(),
+            "files": self.files.get_stats(),
+            "builders": self.builders.get_stats(),
+        }
+
+ASSET_REGISTRY = AssetRegistry()
@@ -0,0 +1,75 @@
+import queue
+import threading
+import time
+import traceback
+
+class AsyncSaver():
+    '''
+        Background writer thread fed through a bounded queue.
+            - `submit(func, *args)` hands a save call to the writer, calls run in submission order.
+            - When the queue is full `submit` blocks (backpressure), the blocked time is counted as stall time.
+            - `flush()` is the end-of-episode barrier, it waits for every pending call and re-raises the first writer error.
+    '''
+    def __init__(self, max_queue_size = 32):
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.error = None
+        self.reset_stats()
+        self.thread = threading.Thread(target=self._run, name='async_saver', daemon=True)
+        self.thread.start()
+
+    def reset_stats(self):
+        self.submit_num = 0
+        self.stall_num = 0
+        self.stall_time = 0.
+        self.max_queue_depth = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "submit_num": self.submit_num,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "stall_num": self.stall_num,
+            "stall_time": self.stall_time,
+        }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            func, args, kwargs = item
+            try:
+                # after an error the remaining calls of the episode are dropped
+                if self.error is None:
+                    func(*args, **kwargs)
+            except Exception:
+                self.error = traceback.format_exc()
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('async save failed:\n' + error)
+
+    def submit(self, func, *args, **kwargs):
+        self._raise_error()
+        self.submit_num += 1
+        self.max_queue_depth = max(self.max_queue_depth, min(self.queue.qsize() + 1, self.queue.maxsize))
+        try:
+            self.queue.put_nowait((func, args, kwargs))
+        except queue.Full:
+            st = time.perf_counter()
+            self.queue.put((func, args, kwargs))
+            self.stall_num += 1
+            self.stall_time += time.perf_counter() - st
+
+    def flush(self):
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
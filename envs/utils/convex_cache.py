@@ -0,0 +1,102 @@
+import os
+import hashlib
+import numpy as np
+from .lazy_import import lazy_import, optional_import
+trimesh = lazy_import('trimesh')
+
+# hulls are stored in a `convex/` directory next to the mesh they are built from
+CONVEX_CACHE_DIR = "convex"
+# "none": no cache, SAPIEN builds one convex hull per sub-mesh from the raw file
+# "coacd": approximate convex decomposition of the whole mesh, cached, if coacd is installed
+CONVEX_DECOMPOSITION = "none"
+COACD_THRESHOLD = 0.05
+
+_mesh_hashes = {}
+
+def set_convex_decomposition(method):
+    global CONVEX_DECOMPOSITION
+    if method not in ('none', 'coacd'):
+        raise ValueError(f'unknown convex decomposition "{method}", expected "none" or "coacd"')
+    CONVEX_DECOMPOSITION = method
+
+def get_decomposition_method(method = None):
+    method = CONVEX_DECOMPOSITION if method is None else method
+    if method == 'coacd' and optional_import('coacd') is None:
+        return 'none'
+    return method
+
+def get_mesh_hash(mesh_file) -> str:
+    '''
+        sha1 of the mesh file, memoized on (path, mtime, size).
+    '''
+    stat = os.stat(mesh_file)
+    key = (os.path.abspath(mesh_file), stat.st_mtime_ns, stat.st_size)
+    if key not in _mesh_hashes:
+        sha1 = hashlib.sha1()
+        with open(mesh_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(chunk)
+        _mesh_hashes[key] = sha1.hexdigest()
+    return _mesh_hashes[key]
+
+def get_convex_cache_file(mesh_file, scale, method = None) -> str:
+    '''
+        Cache path of the hulls of `mesh_file` at `scale`: `<mesh dir>/convex/<name>_<mesh hash>_<scale hash>_<method>.obj`.
+    '''
+    scale = np.broadcast_to(np.array(scale, dtype=np.float64).reshape(-1), 3)
+    scale_hash = hashlib.sha1(np.round(scale, 6).tobytes()).hexdigest()[:8]
+    name = os.path.splitext(os.path.basename(mesh_file))[0]
+    return os.path.join(
+        os.path.dirname(mesh_file), CONVEX_CACHE_DIR,
+        f'{name}_{get_mesh_hash(mesh_file)[:16]}_{scale_hash}_{get_decomposition_method(method)}.obj'
+    )
+
+def decompose_mesh(mesh_file, scale, method = None) -> list:
+    '''
+        CoACD convex parts of the scaled mesh, as a list of (vertices, faces).
+    '''
+    scale = np.broadcast_to(np.array(scale, dtype=np.float64).reshape(-1), 3)
+    meshes = [mesh for mesh in trimesh.load(mesh_file, force='scene').dump() if isinstance(mesh, trimesh.Trimesh) and len(mesh.faces) > 0]
+    mesh = trimesh.util.concatenate(meshes)
+    mesh.apply_transform(np.diag([*scale, 1.]))
+    coacd = optional_import('coacd')
+    parts = coacd.run_coacd(coacd.Mesh(mesh.vertices, mesh.faces), threshold=COACD_THRESHOLD)
+    return [(np.asarray(vertices), np.asarray(faces)) for vertices, faces in parts]
+
+def save_convex_hulls(save_path, hulls):
+    '''
+        Write the hulls as one obj object each, written to a temporary file first so readers never see a partial file.
+    '''
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    lines, vertex_num = [], 0
+    for i, (vertices, faces) in enumerate(hulls):
+        lines.append(f'o convex_{i}')
+        lines.extend(f'v {x:.8g} {y:.8g} {z:.8g}' for x, y, z in vertices)
+        lines.extend(f'f {a} {b} {c}' for a, b, c in np.asarray(faces) + vertex_num + 1)
+        vertex_num += len(vertices)
+    tmp_path = f'{save_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, save_path)
+
+def get_convex_hull_file(mesh_file, scale, method = None):
+    '''
+        Cached convex hull file of `mesh_file` at `scale`, built on first use.
+            - The hulls are already scaled, load them with scale 1.
+            - Returns None without decomposition ("none", or coacd not installed) or if no hull can be built,
+              the caller should fall back to the raw mesh.
+    '''
+    if get_decomposition_method(method) == 'none':
+        return None
+    save_path = get_convex_cache_file(mesh_file, scale, method)
+    if os.path.exists(save_path):
+        return save_path
+    try:
+        hulls = decompose_mesh(mesh_file, scale, method)
+    except Exception as e:
+        print(f'convex decomposition of {mesh_file} failed: {e}')
+        return None
+    if len(hulls) == 0:
+        return None
+    save_convex_hulls(save_path, hulls)
+    return save_path
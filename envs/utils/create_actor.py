@@ -4,6 +4,8 @@ import transforms3d as t3d
 import sapien.physx as sapienp
 import json
 import os
+from .asset_registry import *
+from .convex_cache import *
 
 TACTILE_ON = os.environ.get('VISION_TACTILE_ON', '0') == '1'
 if TACTILE_ON:
@@ -232,6 +234,58 @@ def create_table(
     table.set_pose(pose)
     return table
 
+def _make_mesh_builder(scene, collision_file, visual_file, scale, convex, is_static):
+    builder = scene.create_actor_builder()
+    if is_static:
+        builder.set_physx_body_type("static")
+    else:
+        builder.set_physx_body_type("dynamic")
+
+    # the cached hulls are already scaled
+    hull_file = get_convex_hull_file(collision_file, scale) if convex==True else None
+    if hull_file is not None:
+        builder.add_multiple_convex_collisions_from_file(
+            filename = hull_file,
+            scale = (1,1,1)
+        )
+    elif convex==True:
+        builder.add_multiple_convex_collisions_from_file(
+            filename = collision_file,
+            scale= scale
+        )
+    else:
+        builder.add_nonconvex_collision_from_file(
+            filename = collision_file,
+            scale = scale,
+        )
+    
+    builder.add_visual_from_file(
+        filename=visual_file,
+        scale= scale)
+    return builder
+
+def _create_mesh_actor(scene, pose, modelname, collision_file, visual_file, json_file_path, scale, convex, is_static, z_val_protect):
+    '''
+        Build a mesh actor through `ASSET_REGISTRY`, so the json, the file lookup and the builder are reused across calls.
+    '''
+    model_data = ASSET_REGISTRY.get_model_data(json_file_path)
+    if model_data is not None and "scale" in model_data:
+        scale = model_data["scale"]
+    else:
+        model_data = None
+
+    if z_val_protect:
+        pose.set_p(pose.get_p()[:2].tolist() + [0.74 + (t3d.quaternions.quat2mat(pose.get_q()) @ (np.array(model_data["extents"]) * scale))[2]/2])
+
+    key = (collision_file, visual_file, tuple(np.array(scale, dtype=np.float64).reshape(-1).tolist()), bool(convex) and get_decomposition_method(), bool(is_static))
+    mesh = ASSET_REGISTRY.build(
+        scene, key,
+        lambda scene: _make_mesh_builder(scene, collision_file, visual_file, scale, convex, is_static),
+        name=modelname
+    )
+    mesh.set_pose(pose)
+    return mesh, model_data
+
 # create obj model
 def create_obj(
     scene: sapien.Scene,
@@ -255,7 +309,7 @@ def create_obj(
             model_z_val=z_val_protect
         )
 
-    modeldir = "./assets/objects/"+modelname+"/"
+    modeldir = ASSET_DIR+modelname+"/"
     if model_id is None:
         file_name = modeldir + "textured.obj"
         json_file_path = modeldir + 'model_data.json'
@@ -263,40 +317,7 @@ def create_obj(
         file_name = modeldir + f"textured{model_id}.obj"
         json_file_path = modeldir + f'model_data{model_id}.json'
 
-    try:
-        with open(json_file_path, 'r') as file:
-            model_data = json.load(file)
-        scale = model_data["scale"]
-    except:
-        model_data = None
-        
-    builder = scene.create_actor_builder()
-    if is_static:
-        builder.set_physx_body_type("static")
-    else:
-        builder.set_physx_body_type("dynamic")
-
-    if z_val_protect:
-        pose.set_p(pose.get_p()[:2].tolist() + [0.74 + (t3d.quaternions.quat2mat(pose.get_q()) @ (np.array(model_data["extents"]) * scale))[2]/2])
-        
-    if convex==True:
-        builder.add_multiple_convex_collisions_from_file(
-            filename = file_name,
-            scale= scale
-        )
-    else:
-        builder.add_nonconvex_collision_from_file(
-            filename = file_name,
-            scale = scale
-        )
-    
-    builder.add_visual_from_file(
-        filename=file_name,
-        scale= scale)
-    mesh = builder.build(name=modelname)
-    mesh.set_pose(pose)
-    
-    return mesh, model_data
+    return _create_mesh_actor(scene, pose, modelname, file_name, file_name, json_file_path, scale, convex, is_static, z_val_protect)
 
 
 # create glb model
@@ -322,60 +343,15 @@ def create_glb(
             model_z_val=z_val_protect
         )
     
-    modeldir = "./assets/objects/"+modelname+"/"
+    modeldir = ASSET_DIR+modelname+"/"
     if model_id is None:
         file_name = modeldir + "base.glb"
         json_file_path = modeldir + 'model_data.json'
     else:
         file_name = modeldir + f"base{model_id}.glb"
         json_file_path = modeldir + f'model_data{model_id}.json'
-    
-    try:
-        with open(json_file_path, 'r') as file:
-            model_data = json.load(file)
-        scale = model_data["scale"]
-    except:
-        model_data = None
-    
-    builder = scene.create_actor_builder()
-    if is_static:
-        builder.set_physx_body_type("static")
-    else:
-        builder.set_physx_body_type("dynamic")
-
-    if z_val_protect:
-        pose.set_p(pose.get_p()[:2].tolist() + [0.74 + (t3d.quaternions.quat2mat(pose.get_q()) @ (np.array(model_data["extents"]) * scale))[2]/2])
-
-    if convex==True:
-        builder.add_multiple_convex_collisions_from_file(
-            filename = file_name,
-            scale= scale
-        )
-    else:
-        builder.add_nonconvex_collision_from_file(
-            filename = file_name,
-            scale = scale,
-        )
-    
-    builder.add_visual_from_file(
-        filename=file_name,
-        scale= scale)
-    mesh = builder.build(name=modelname)
-    mesh.set_pose(pose)
 
-    return mesh, model_data
-
-def get_glb_or_obj_file(modeldir, model_id):
-    if model_id is None:
-        file = modeldir + "base.glb"
-    else:
-        file = modeldir + f"base{model_id}.glb"
-    if not os.path.exists(file):
-        if model_id is None:
-            file = modeldir + "textured.obj"
-        else:
-            file = modeldir + f"textured{model_id}.obj"
-    return file
+    return _create_mesh_actor(scene, pose, modelname, file_name, file_name, json_file_path, scale, convex, is_static, z_val_protect)
 
 def create_actor(
     scene: sapien.Scene,
@@ -387,32 +363,6 @@ def create_actor(
     model_id = None,
     z_val_protect = False
 ) -> sapien.Entity:
-    # try:
-    #     return create_glb(
-    #         scene = scene,
-    #         pose = pose,
-    #         modelname = modelname,
-    #         scale = scale,
-    #         convex = convex,
-    #         is_static = is_static,
-    #         model_id = model_id,
-    #         z_val_protect = z_val_protect
-    #     )
-    # except:
-    #     try:
-    #         return create_obj(
-    #             scene = scene,
-    #             pose = pose,
-    #             modelname = modelname,
-    #             scale = scale,
-    #             convex = convex,
-    #             is_static = is_static,
-    #             model_id = model_id,
-    #             z_val_protect = z_val_protect
-    #         )
-    #     except:
-    #         print(modelname, 'is not exsist model file!')
-    #         return None, None
     if TACTILE_ON:
         return ipc_create_actor(
             scene=scene,
@@ -425,62 +375,19 @@ def create_actor(
             model_z_val=z_val_protect
         )
 
-    modeldir = "./assets/objects/"+modelname+"/"
+    modeldir = ASSET_DIR+modelname+"/"
 
     if model_id is None:
         json_file_path = modeldir + 'model_data.json'
     else:
         json_file_path = modeldir + f'model_data{model_id}.json'
 
-    collision_file = ""
-    visual_file = ""
-    if os.path.exists(modeldir + "collision/"):
-        collision_file = get_glb_or_obj_file(modeldir + 'collision/', model_id)
-    if not os.path.exists(collision_file):
-        collision_file = get_glb_or_obj_file(modeldir, model_id)
-
-    if os.path.exists(modeldir + "visual/"):
-        visual_file = get_glb_or_obj_file(modeldir + 'visual/', model_id)
-    if not os.path.exists(visual_file):
-        visual_file = get_glb_or_obj_file(modeldir, model_id)
-    
-    if not os.path.exists(collision_file) or not os.path.exists(visual_file):
+    collision_file, visual_file = ASSET_REGISTRY.get_model_files(modelname, model_id)
+    if collision_file is None:
         print(modelname, 'is not exsist model file!')
         return None, None
-    
-    try:
-        with open(json_file_path, 'r') as file:
-            model_data = json.load(file)
-        scale = model_data["scale"]
-    except:
-        model_data = None
-    
-    builder = scene.create_actor_builder()
-    if is_static:
-        builder.set_physx_body_type("static")
-    else:
-        builder.set_physx_body_type("dynamic")
 
-    if z_val_protect:
-        pose.set_p(pose.get_p()[:2].tolist() + [0.74 + (t3d.quaternions.quat2mat(pose.get_q()) @ (np.array(model_data["extents"]) * scale))[2]/2])
-
-    if convex==True:
-        builder.add_multiple_convex_collisions_from_file(
-            filename = collision_file,
-            scale= scale
-        )
-    else:
-        builder.add_nonconvex_collision_from_file(
-            filename = collision_file,
-            scale = scale,
-        )
-    
-    builder.add_visual_from_file(
-        filename=visual_file,
-        scale= scale)
-    mesh = builder.build(name=modelname)
-    mesh.set_pose(pose)
-    return mesh, model_data
+    return _create_mesh_actor(scene, pose, modelname, collision_file, visual_file, json_file_path, scale, convex, is_static, z_val_protect)
 
 
 # create urdf model
@@ -491,21 +398,19 @@ def create_urdf_obj(
     scale = 1.0,
     fix_root_link = True
 )->sapienp.PhysxArticulation: 
-    modeldir = "./assets/objects/"+modelname+"/"
+    modeldir = ASSET_DIR+modelname+"/"
     json_file_path = modeldir + 'model_data.json'
     loader: sapien.URDFLoader = scene.create_urdf_loader()
     loader.scale = scale
     
+    model_data = ASSET_REGISTRY.get_model_data(json_file_path)
     try:
-        with open(json_file_path, 'r') as file:
-            model_data = json.load(file)
         loader.scale = model_data["scale"][0]
     except:
         model_data = None
 
     loader.fix_root_link = fix_root_link
     loader.load_multiple_collisions_from_file = True
-    modeldir = "./assets/objects/"+modelname+"/"
     object: sapien.Articulation = loader.load(modeldir+"mobility.urdf")
     
     object.set_root_pose(pose)
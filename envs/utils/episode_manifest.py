@@ -0,0 +1,83 @@
+import os
+import json
+
+def verify_episode_data(data_path, frame_num) -> bool:
+    '''
+        Check that an episode's frames are all on disk.
+            - zarr store: the finalized frame count matches.
+            - pkl directory: `0.pkl` ... `{frame_num-1}.pkl` exist.
+    '''
+    if data_path is None or not os.path.exists(data_path):
+        return False
+    if data_path.rstrip('/').endswith('.zarr'):
+        try:
+            if os.path.exists(os.path.join(data_path, '.zattrs')):
+                with open(os.path.join(data_path, '.zattrs'), 'r') as f:
+                    attrs = json.load(f)
+            else:
+                # zarr v3 layout
+                with open(os.path.join(data_path, 'zarr.json'), 'r') as f:
+                    attrs = json.load(f).get('attributes', {})
+        except (OSError, ValueError):
+            return False
+        return attrs.get('num_frames') == frame_num
+    return all(os.path.exists(os.path.join(data_path, f'{i}.pkl')) for i in range(frame_num))
+
+class EpisodeManifest():
+    '''
+        Append-only JSONL log of collected episodes, one record per line.
+            - Each record is fsynced, a crash can at most lose the line being written, which is skipped on load.
+            - The last record of an episode id wins.
+    '''
+    def __init__(self, save_path):
+        self.save_path = save_path
+        self.records = {}
+        if os.path.exists(save_path):
+            with open(save_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.records[record['episode']] = record
+
+    def append(self, record: dict):
+        os.makedirs(os.path.dirname(self.save_path) or '.', exist_ok=True)
+        with open(self.save_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.records[record['episode']] = record
+
+    def record_episode(self, ep_id, seed, status, timings = None, info = None, data_path = None, frame_num = 0, error = None, traj_cache = None):
+        record = {
+            "episode": ep_id,
+            "seed": seed,
+            "status": status,
+            "timings": timings or {},
+            "data_path": data_path,
+            "frame_num": frame_num,
+            "info": info,
+        }
+        if error is not None:
+            record["error"] = error
+        if traj_cache is not None:
+            record["traj_cache"] = traj_cache
+        self.append(record)
+
+    def is_completed(self, ep_id, seed) -> bool:
+        record = self.records.get(ep_id)
+        return record is not None and record['status'] == 'success' and record['seed'] == seed and \
+            verify_episode_data(record['data_path'], record['frame_num'])
+
+    def export_info(self, save_path):
+        '''
+            Write `{episode: info}` of the successful episodes (the old scene_info.json layout) atomically.
+        '''
+        info_db = {str(ep_id): record['info'] for ep_id, record in sorted(self.records.items()) if record['status'] == 'success'}
+        tmp_path = save_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(info_db, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, save_path)
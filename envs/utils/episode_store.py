@@ -0,0 +1,158 @@
+import numpy as np
+from .lazy_import import lazy_import
+zarr = lazy_import('zarr')
+numcodecs = lazy_import('numcodecs')
+
+# frames per chunk for each modality, keyed by the leaf name of the observation dict
+DEFAULT_CHUNK_FRAMES = {
+    'rgb': 16,
+    'depth': 16,
+    'mesh_segmentation': 16,
+    'actor_segmentation': 16,
+    'obs_rgba': 16,
+    'pointcloud': 32,
+}
+LOW_DIM_CHUNK_FRAMES = 256
+# leaves whose first dimension changes from frame to frame, stored flat with a per-frame length array
+RAGGED_KEYS = ('pointcloud',)
+RAGGED_LEN_SUFFIX = '__len'
+
+def flatten_frame(frame: dict, prefix = '') -> dict:
+    '''
+        Flatten a nested observation dict into `{'observation/head_camera/rgb': value, ...}`.
+    '''
+    res = {}
+    for key, value in frame.items():
+        path = f'{prefix}/{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            res.update(flatten_frame(value, path))
+        else:
+            res[path] = value
+    return res
+
+def unflatten_frame(flat: dict) -> dict:
+    res = {}
+    for path, value in flat.items():
+        node = res
+        keys = path.split('/')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return res
+
+class EpisodeWriter():
+    '''
+        Columnar episode store, one zarr group per episode.
+            - Every leaf of the observation dict becomes a chunked, compressed array with the frame index as first axis.
+            - `pointcloud` is stored flat as [sum(N_i), C] plus a per-frame length array.
+            - Leaves that are not numeric (e.g. strings) are kept once in the group attrs.
+    '''
+    def __init__(self, save_path, chunk_frames: dict = None, compressor = None):
+        self.save_path = save_path
+        self.chunk_frames = dict(DEFAULT_CHUNK_FRAMES)
+        if chunk_frames is not None:
+            self.chunk_frames.update(chunk_frames)
+        self.compressor = compressor if compressor is not None else numcodecs.Blosc(cname='zstd', clevel=3, shuffle=numcodecs.Blosc.BITSHUFFLE)
+        self.root = zarr.open_group(save_path, mode='w')
+        self.arrays = {}
+        self.static = {}
+        self.num_frames = 0
+
+    def _get_chunk_frames(self, key):
+        return self.chunk_frames.get(key.split('/')[-1], LOW_DIM_CHUNK_FRAMES)
+
+    def _create_array(self, key, value: np.ndarray, ragged = False):
+        chunk_frames = self._get_chunk_frames(key)
+        if ragged:
+            shape = (0,) + value.shape[1:]
+            chunks = (chunk_frames * max(value.shape[0], 1),) + value.shape[1:]
+        else:
+            shape = (0,) + value.shape
+            chunks = (chunk_frames,) + value.shape
+        return self.root.create_dataset(key, shape=shape, chunks=chunks, dtype=value.dtype, compressor=self.compressor)
+
+    def append(self, frame: dict):
+        for key, value in flatten_frame(frame).items():
+            # disabled modalities are left as None / [] by get_obs
+            if value is None or (isinstance(value, list) and len(value) == 0):
+                continue
+            if key in self.static:
+                continue
+            value = np.asarray(value)
+            if value.dtype == object or value.dtype.kind in 'US':
+                self.static[key] = value.tolist()
+                continue
+            if key.split('/')[-1] in RAGGED_KEYS:
+                self._append_ragged(key, value)
+                continue
+            if key not in self.arrays:
+                if self.num_frames > 0:
+                    raise ValueError(f'{key} first appeared at frame {self.num_frames}, keys must not change within an episode')
+                self.arrays[key] = self._create_array(key, value)
+            self.arrays[key].append(value[None])
+        self.num_frames += 1
+
+    def _append_ragged(self, key, value: np.ndarray):
+        len_key = key + RAGGED_LEN_SUFFIX
+        if len_key not in self.arrays:
+            if self.num_frames > 0:
+                raise ValueError(f'{key} first appeared at frame {self.num_frames}, keys must not change within an episode')
+            self.arrays[len_key] = self._create_array(len_key, np.zeros((), dtype=np.int64))
+        if value.size > 0:
+            if key not in self.arrays:
+                self.arrays[key] = self._create_array(key, value, ragged=True)
+            self.arrays[key].append(value)
+        self.arrays[len_key].append(np.array([value.shape[0] if value.size > 0 else 0], dtype=np.int64))
+
+    def close(self):
+        self.root.attrs['num_frames'] = self.num_frames
+        self.root.attrs['keys'] = sorted(key for key in self.arrays if not key.endswith(RAGGED_LEN_SUFFIX))
+        self.root.attrs['ragged_keys'] = sorted(key for key in self.arrays if key.split('/')[-1] in RAGGED_KEYS)
+        self.root.attrs['static'] = self.static
+
+class EpisodeReader():
+    '''
+        Read an episode written by `EpisodeWriter`.
+            - `reader[i]` returns frame i as the same nested dict `get_obs` produced.
+            - `reader.get(key, index)` reads a single modality, `index` may be an int, a slice or None for all frames.
+    '''
+    def __init__(self, save_path):
+        self.root = zarr.open_group(save_path, mode='r')
+        self.num_frames = self.root.attrs['num_frames']
+        self.ragged_keys = set(self.root.attrs['ragged_keys'])
+        self.static = self.root.attrs['static']
+        self._offsets = {}
+
+    def __len__(self):
+        return self.num_frames
+
+    def keys(self):
+        return list(self.root.attrs['keys']) + list(self.static.keys())
+
+    def _get_offsets(self, key):
+        if key not in self._offsets:
+            lens = self.root[key + RAGGED_LEN_SUFFIX][:]
+            self._offsets[key] = np.concatenate([[0], np.cumsum(lens)])
+        return self._offsets[key]
+
+    def get(self, key, index = None):
+        if key in self.static:
+            return self.static[key]
+        if key not in self.ragged_keys:
+            return self.root[key][:] if index is None else self.root[key][index]
+
+        offsets = self._get_offsets(key)
+        if isinstance(index, (int, np.integer)):
+            return self.root[key][offsets[index]:offsets[index + 1]]
+        index = range(self.num_frames)[index if index is not None else slice(None)]
+        if len(index) == 0:
+            return []
+        data = self.root[key][offsets[index[0]]:offsets[index[-1] + 1]]
+        return [data[offsets[i] - offsets[index[0]]:offsets[i + 1] - offsets[index[0]]] for i in index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError(f'frame {index} out of range ({self.num_frames} frames)')
+        return unflatten_frame({key: self.get(key, index) for key in self.keys()})
@@ -1 +1,56 @@
+import numpy as np
 
+def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    '''
+        Index of one point per occupied voxel of a `voxel_size` grid (the first point of the voxel), in input order.
+    '''
+    points = np.asarray(points[:, :3], dtype=np.float32)
+    voxel = np.floor((points - points.min(axis=0)) / voxel_size).astype(np.int64)
+    dims = voxel.max(axis=0) + 1
+    key = (voxel[:, 0] * dims[1] + voxel[:, 1]) * dims[2] + voxel[:, 2]
+    _, index = np.unique(key, return_index=True)
+    return np.sort(index)
+
+def farthest_point_sampling(points: np.ndarray, num_points: int, seed = None) -> np.ndarray:
+    '''
+        Index of `num_points` points picked by farthest point sampling, O(N * K).
+            - Distances are float32, the distance of every point to the sampled set is updated incrementally.
+            - The first point is point 0, or a point drawn with `seed`, so the result is deterministic.
+    '''
+    point_num = len(points)
+    if point_num <= num_points:
+        return np.arange(point_num)
+    # one contiguous array per axis keeps every update a few streaming passes without temporaries
+    x, y, z = (np.ascontiguousarray(points[:, i], dtype=np.float32) for i in range(3))
+    now_id = 0 if seed is None else int(np.random.default_rng(seed).integers(point_num))
+
+    index = np.empty(num_points, dtype=np.int64)
+    min_dis = np.full(point_num, np.inf, dtype=np.float32)
+    dis = np.empty(point_num, dtype=np.float32)
+    tmp = np.empty(point_num, dtype=np.float32)
+    for i in range(num_points):
+        index[i] = now_id
+        np.subtract(x, x[now_id], out=dis)
+        np.multiply(dis, dis, out=dis)
+        for axis in (y, z):
+            np.subtract(axis, axis[now_id], out=tmp)
+            np.multiply(tmp, tmp, out=tmp)
+            dis += tmp
+        np.minimum(min_dis, dis, out=min_dis)
+        now_id = int(np.argmax(min_dis))
+    return index
+
+def sample_farthest_points(points: np.ndarray, num_points: int, voxel_size = 0., seed = None):
+    '''
+        Farthest point sampling with an optional voxel-grid pre-reduction.
+            - `voxel_size` > 0: the input is first reduced to one point per voxel, which makes 100k+ point clouds cheap.
+              The reduction is skipped if it leaves fewer than `num_points` points.
+            - Returns the sampled points and their index into `points`.
+    '''
+    candidate = np.arange(len(points))
+    if voxel_size > 0:
+        voxel_index = voxel_downsample(points, voxel_size)
+        if len(voxel_index) >= num_points:
+            candidate = voxel_index
+    index = candidate[farthest_point_sampling(points[candidate], num_points, seed)]
+    return points[index], index
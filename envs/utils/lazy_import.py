@@ -0,0 +1,48 @@
+import sys
+import types
+import importlib
+
+class LazyModule(types.ModuleType):
+    '''
+        Stand-in for a module that is imported on first attribute access.
+            - `o3d = lazy_import('open3d')` then `o3d.io.write_point_cloud(...)` imports open3d at that call.
+            - A missing module raises its ImportError at first use, not when `envs` is imported.
+    '''
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self.__dict__['_module'] is None:
+            self.__dict__['_module'] = importlib.import_module(self.__name__)
+        return self.__dict__['_module']
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name):
+    '''
+        The module itself if it is already imported, otherwise a `LazyModule`.
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+_optional_modules = {}
+
+def optional_import(name):
+    '''
+        Import an optional dependency on first use, None if it is not installed. The result is memoized.
+    '''
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+def is_imported(name) -> bool:
+    return name in sys.modules
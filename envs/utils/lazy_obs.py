@@ -0,0 +1,40 @@
+from collections.abc import Mapping
+
+class LazyObs(Mapping):
+    '''
+        Read-only observation mapping whose values are computed on first access and then memoized.
+            - A callable value is a loader, it is called once, on first access of its key.
+            - Nested dicts are wrapped as well, so `obs['observation']['head_camera']['rgb']` computes only the head RGB.
+            - `check()` runs before every loader, so an observation of a past frame can refuse to compute.
+    '''
+    def __init__(self, items: dict, check = None):
+        self._check = check
+        self._items = {key: LazyObs(value, check) if isinstance(value, dict) else value for key, value in items.items()}
+        self._loaded = {key for key, value in self._items.items() if not callable(value)}
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            loader = self._items[key]
+            if self._check is not None:
+                self._check()
+            self._items[key] = loader()
+            self._loaded.add(key)
+        return self._items[key]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def is_loaded(self, key) -> bool:
+        return key in self._loaded
+
+    def to_dict(self) -> dict:
+        '''
+            Compute every value and return a plain nested dict, the layout `get_obs(is_policy=False)` returns.
+        '''
+        return {key: value.to_dict() if isinstance(value, LazyObs) else value for key, value in self.items()}
@@ -0,0 +1,133 @@
+import os
+import json
+import fcntl
+import pickle
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from envs._GLOBAL_CONFIGS import CACHE_PATH
+from .asset_registry import LRUCache
+from .traj_cache import ARM_RESULT_KEYS
+
+# start qpos (rad) and target pose are quantized to these steps to build the key
+PLAN_QPOS_QUANT = 1e-3
+PLAN_TARGET_QUANT = 1e-4
+PLAN_CACHE_SIZE = 512
+
+# caches of this process, keyed by save path, kept across episodes
+_plan_caches = {}
+
+def quantize(values, step) -> tuple:
+    return tuple(np.round(np.asarray(values, dtype=np.float64).reshape(-1) / step).astype(np.int64).tolist())
+
+class PlanCache():
+    '''
+        Successful arm plans of one planner, reused when the same move is planned again.
+            - Key: the planner type, the collision-world version, the start qpos quantized to `PLAN_QPOS_QUANT`
+              and the planner target pose (`Robot._trans_target_pose`) quantized to `PLAN_TARGET_QUANT`.
+            - A hit is validated before reuse: the recorded start qpos and target are within one quantization step of the
+              current ones, and the trajectory starts at the current joint positions of the move group.
+            - LRU eviction. Plans of the robot-only world (version 0) are saved to `.cache/plan_cache/` and loaded by later runs.
+              Processes sharing the file (farm workers) merge their plans into it under a file lock.
+    '''
+    def __init__(self, save_path, max_size = PLAN_CACHE_SIZE):
+        self.save_path = save_path
+        self.cache = LRUCache(max_size)
+        self.reject_num = 0
+        self.dirty = False
+        for key, entry in self._load_items(save_path):
+            self.cache.put(key, entry)
+
+    @staticmethod
+    def _load_items(save_path) -> list:
+        '''
+            Saved (key, entry) pairs, least recently used first, empty if the file is missing or unreadable.
+        '''
+        if not os.path.exists(save_path):
+            return []
+        try:
+            with open(save_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f'plan cache {save_path} could not be loaded: {e}')
+            return []
+
+    @staticmethod
+    def get_target(target_pose) -> np.ndarray:
+        q = np.array(target_pose.q, dtype=np.float64)
+        # q and -q are the same rotation
+        if q[0] < 0:
+            q = -q
+        return np.concatenate([np.array(target_pose.p, dtype=np.float64), q])
+
+    @staticmethod
+    def get_key(planner_type, world_version, now_qpos, target) -> tuple:
+        return (planner_type, world_version, quantize(now_qpos, PLAN_QPOS_QUANT), quantize(target, PLAN_TARGET_QUANT))
+
+    def get(self, planner_type, world_version, now_qpos, target_pose, joint_indices = None):
+        '''
+            Cached plan from `now_qpos` to `target_pose`, None on a miss or if the cached plan does not validate.
+                `joint_indices`: indices of the move-group joints in `now_qpos`, the joints of the plan positions.
+        '''
+        now_qpos = np.asarray(now_qpos, dtype=np.float64).reshape(-1)
+        target = self.get_target(target_pose)
+        entry = self.cache.lookup(self.get_key(planner_type, world_version, now_qpos, target))
+        if entry is None:
+            return None
+        valid = entry['now'].shape == now_qpos.shape and \
+            np.abs(entry['now'] - now_qpos).max() <= PLAN_QPOS_QUANT and np.abs(entry['target'] - target).max() <= PLAN_TARGET_QUANT
+        if valid and joint_indices is not None:
+            valid = np.abs(entry['result']['position'][0] - now_qpos[joint_indices]).max() <= PLAN_QPOS_QUANT
+        if not valid:
+            self.reject_num += 1
+            return None
+        return dict(entry['result'])
+
+    def put(self, planner_type, world_version, now_qpos, target_pose, result):
+        if result['status'] != 'Success':
+            return
+        now_qpos = np.array(now_qpos, dtype=np.float64).reshape(-1)
+        target = self.get_target(target_pose)
+        self.cache.put(self.get_key(planner_type, world_version, now_qpos, target), {
+            'now': now_qpos,
+            'target': target,
+            'result': {key: result[key] for key in ARM_RESULT_KEYS if key in result},
+        })
+        if world_version == 0:
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.save_path), exist_ok=True)
+        with open(f'{self.save_path}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # plans saved by other processes are kept, the plans of this process count as the most recently used
+            items = OrderedDict(self._load_items(self.save_path))
+            for key, entry in self.cache.entries.items():
+                if key[1] == 0:
+                    items.pop(key, None)
+                    items[key] = entry
+            tmp_path = f'{self.save_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(list(items.items())[-self.cache.max_size:], f)
+            os.replace(tmp_path, self.save_path)
+        self.dirty = False
+
+    def get_stats(self) -> dict:
+        stats = self.cache.get_stats()
+        stats['reject_num'] = self.reject_num
+        return stats
+
+def get_plan_cache(spec, max_size = PLAN_CACHE_SIZE) -> PlanCache:
+    '''
+        Plan cache of the planner of `spec` (`MplibPlanner.spec`): from this process, else loaded from `.cache/plan_cache/`.
+    '''
+    spec_key = hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    save_path = os.path.join(CACHE_PATH, 'plan_cache', f'{spec_key}.pkl')
+    if save_path not in _plan_caches:
+        _plan_caches[save_path] = PlanCache(save_path, max_size)
+    plan_cache = _plan_caches[save_path]
+    plan_cache.cache.max_size = max_size
+    plan_cache.cache.shrink()
+    return plan_cache
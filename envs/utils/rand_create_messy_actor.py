@@ -21,6 +21,72 @@ def check_overlap(radius, x, y, area):
     return dx * dx + dy * dy <= radius * radius
 
 
+# same cap as the one-candidate-at-a-time loop this replaces
+MESSY_POSE_MAX_ATTEMPTS = 100000
+MESSY_POSE_BATCH = 64
+# candidates tried one at a time first, most draws on a sparse table succeed within them and need no RNG rewind
+MESSY_POSE_SINGLE_TRIES = 4
+
+def messy_xy_mask(x, y, ylim, obj_radius, z_max, objs, areas) -> np.ndarray:
+    '''
+        Valid mask of candidate positions `x`, `y` ([N] arrays), the vectorized form of the per-candidate checks:
+            - outside every prohibited area ([K, 4] `areas`, x1 y1 x2 y2) grown by `obj_radius` (`check_overlap`),
+            - outside the area in front of the robot base when the object is taller than 0.07,
+            - on the table, and below `ylim[1]`,
+            - farther than `size + obj_radius` from every object ([M, 3] `objs`, x y size).
+    '''
+    valid = (x - obj_radius >= -0.6) & (x + obj_radius <= 0.6) & (y - obj_radius >= -0.34) & (y + obj_radius <= 0.34)
+    valid &= y + obj_radius < ylim[1]
+    if z_max > 0.07:
+        valid &= ~((x > -0.24) & (x < 0.25) & (y > -0.34) & (y < 0))
+    if len(areas) > 0:
+        dx = np.maximum(np.maximum(areas[:, 0] - x[:, None], x[:, None] - areas[:, 2]), 0)
+        dy = np.maximum(np.maximum(areas[:, 1] - y[:, None], y[:, None] - areas[:, 3]), 0)
+        valid &= np.all(dx * dx + dy * dy > obj_radius * obj_radius, axis=1)
+    if len(objs) > 0:
+        distances = np.sqrt((objs[:, 0] - x[:, None]) ** 2 + (objs[:, 1] - y[:, None]) ** 2)
+        valid &= np.all(distances > objs[:, 2] + obj_radius, axis=1)
+    return valid
+
+def rand_xy_messy(xlim, ylim, obj_radius, z_max, size_dict, prohibited_area, occupancy = None):
+    '''
+        Rejection-sample a free (x, y) in batches of candidates, returns (success, x, y).
+            - Candidates are drawn as (x, y) pairs from the global numpy RNG, in the order the old per-candidate loop drew them.
+              After a hit the RNG is rewound to just after the accepted pair, so the result and the RNG stream
+              are the same as with the old loop and recorded seeds still give the same scenes.
+            - At most MESSY_POSE_MAX_ATTEMPTS candidates are drawn.
+            - With a `TableOccupancyGrid`, objects and prohibited areas are tested through it instead of `size_dict`
+              and `prohibited_area`, which it must hold as well.
+    '''
+    if occupancy is not None:
+        objs, areas = np.zeros((0, 3)), np.zeros((0, 4))
+    else:
+        objs = np.array([[sub_list[0], sub_list[1], sub_list[3]] for sub_list in size_dict or []], dtype=np.float64).reshape(-1, 3)
+        areas = np.array(prohibited_area or [], dtype=np.float64).reshape(-1, 4)
+    x_low, y_low = float(xlim[0]), float(ylim[0])
+    x_range, y_range = float(xlim[1]) - x_low, float(ylim[1]) - y_low
+    attempts, batch = 0, MESSY_POSE_BATCH
+    while attempts < MESSY_POSE_MAX_ATTEMPTS:
+        batch_num = 1 if attempts < MESSY_POSE_SINGLE_TRIES else min(batch, MESSY_POSE_MAX_ATTEMPTS - attempts)
+        # saving the RNG state costs more than checking a few candidates, a single candidate never needs a rewind
+        state = np.random.get_state() if batch_num > 1 else None
+        samples = np.random.random_sample((batch_num, 2))
+        x = x_low + x_range * samples[:, 0]
+        y = y_low + y_range * samples[:, 1]
+        valid = messy_xy_mask(x, y, ylim, obj_radius, z_max, objs, areas)
+        if occupancy is not None:
+            valid[valid] = occupancy.free_mask(x[valid], y[valid], obj_radius)
+        hit = np.flatnonzero(valid)
+        if len(hit) > 0:
+            if state is not None:
+                np.random.set_state(state)
+                np.random.random_sample((hit[0] + 1) * 2)
+            return True, x[hit[0]], y[hit[0]]
+        attempts += batch_num
+        if batch_num > 1:
+            batch = min(batch * 2, 8192)
+    return False, None, None
+
 def rand_pose_messy(
     xlim: np.ndarray,
     ylim: np.ndarray,
@@ -33,7 +99,8 @@ def rand_pose_messy(
     obj_radius = 0.1,
     z_offset = 0.001,
     z_max = 0,
-    prohibited_area = None
+    prohibited_area = None,
+    occupancy = None
 ) -> sapien.Pose:  
     if (len(xlim)<2 or xlim[1]<xlim[0]):
         xlim=np.array([xlim[0],xlim[0]])
@@ -42,35 +109,10 @@ def rand_pose_messy(
     if (len(zlim)<2 or zlim[1]<zlim[0]):
         zlim=np.array([zlim[0],zlim[0]])
     
-    times = 0
-    while True:
-        times += 1
-        if times > 100000:
-            return False, None
-        x = np.random.uniform(xlim[0], xlim[1])
-        y = np.random.uniform(ylim[0], ylim[1])
-        is_overlap = False
-        for area in prohibited_area:
-            # if x + obj_radius >= area[0] and x - obj_radius <= area[1] and y - obj_radius >= area[2] and y + obj_radius <= area[3]:
-            #     continue
-            # if x > area[0] and x < area[1] and y > area[2] and y < area[3]:
-            #     continue
-            if check_overlap(obj_radius, x, y, area):
-                is_overlap = True
-                break
-        if is_overlap:
-            continue
-        distances = np.sqrt((np.array([sub_list[0] for sub_list in size_dict]) - x) ** 2 + (np.array([sub_list[1] for sub_list in size_dict]) - y) ** 2)
-        max_distances = np.array([sub_list[3] + obj_radius for sub_list in size_dict])
-
-        if x > -0.24 and x < 0.25 and y > -0.34 and y < 0:
-            if z_max > 0.07:
-                continue
-        if x - obj_radius < -0.6 or x + obj_radius > 0.6 or y - obj_radius < -0.34 or y + obj_radius > 0.34:
-            continue
-        if np.all(distances > max_distances) and y + obj_radius < ylim[1]:
-            break
-        
+    success, x, y = rand_xy_messy(xlim, ylim, obj_radius, z_max, size_dict, prohibited_area, occupancy)
+    if not success:
+        return False, None
+
     z = np.random.uniform(zlim[0],zlim[1])
     z = z - z_offset
 
@@ -140,7 +182,8 @@ def rand_create_messy_obj(
     size_dict = None,
     obj_radius = 0.1,
     z_offset = 0.001,
-    prohibited_area = None
+    prohibited_area = None,
+    occupancy = None
 ) -> sapien.Entity:
     
     success, obj_pose = rand_pose_messy(
@@ -154,7 +197,8 @@ def rand_create_messy_obj(
         size_dict=size_dict,
         obj_radius = obj_radius,
         z_offset=z_offset,
-        prohibited_area=prohibited_area
+        prohibited_area=prohibited_area,
+        occupancy=occupancy
     )
     if not success:
         return False, None
@@ -180,9 +224,8 @@ def create_urdf_obj(
     file_name = modeldir + "base.glb"
     json_file_path = modeldir + 'model_data.json'
     
+    model_data = ASSET_REGISTRY.get_model_data(json_file_path)
     try:
-        with open(json_file_path, 'r') as file:
-            model_data = json.load(file)
         scale = model_data["scale"]
     except:
         model_data = None
@@ -213,7 +256,8 @@ def rand_create_messy_urdf_obj(
     obj_radius = 0.1,
     z_offset = 0.001,
     z_max = 0,
-    prohibited_area = None
+    prohibited_area = None,
+    occupancy = None
 )->sapienp.PhysxArticulation: 
     
     success, obj_pose = rand_pose_messy(
@@ -228,7 +272,8 @@ def rand_create_messy_urdf_obj(
         obj_radius = obj_radius,
         z_offset = z_offset,
         z_max = z_max,
-        prohibited_area = prohibited_area
+        prohibited_area = prohibited_area,
+        occupancy = occupancy
     )
     if not success:
         return False, None
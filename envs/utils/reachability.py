@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from envs._GLOBAL_CONFIGS import CACHE_PATH, GRASP_DIRECTION_DIC
+from .table_occupancy import TABLE_XLIM, TABLE_YLIM
+
+ARM_TAGS = ('left', 'right')
+REACH_CELL_SIZE = 0.05
+# endpose height of the grasps checked, about the contact points of objects standing on the 0.74 table
+REACH_HEIGHT = 0.8
+
+# maps loaded in this process, keyed by cache file
+_loaded_maps = {}
+
+def get_embodiment_key(embodiment_args: dict) -> str:
+    '''
+        Hash of everything of the embodiment that changes which poses the arms reach.
+    '''
+    return hashlib.sha1(json.dumps(embodiment_args, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+class ReachabilityMap():
+    '''
+        Per-arm, per-grasp-direction reachability of grasp poses over a grid of the table surface.
+            - `reachable[arm, direction, i, j]`: whether the endpose at (xs[i], ys[j], height) with the direction
+              of `GRASP_DIRECTION_DIC` has a collision-free IK solution for the arm.
+            - Only the robot is in the planning world, so the map depends on the embodiment and not on the scene,
+              and is computed once per embodiment and cached on disk.
+            - `is_reachable` is conservative: a position is rejected only if none of the 4 grid points around it is reachable.
+    '''
+    def __init__(self, xlim = TABLE_XLIM, ylim = TABLE_YLIM, cell_size = REACH_CELL_SIZE, height = REACH_HEIGHT,
+                 directions = tuple(GRASP_DIRECTION_DIC)):
+        self.xs = np.arange(xlim[0], xlim[1] + cell_size / 2, cell_size)
+        self.ys = np.arange(ylim[0], ylim[1] + cell_size / 2, cell_size)
+        self.height = height
+        self.directions = list(directions)
+        self.reachable = np.zeros((len(ARM_TAGS), len(self.directions), len(self.xs), len(self.ys)), dtype=bool)
+
+    def get_meta(self) -> dict:
+        return {
+            "xs": self.xs.round(6).tolist(),
+            "ys": self.ys.round(6).tolist(),
+            "height": self.height,
+            "directions": self.directions,
+        }
+
+    def build(self, check_func, log = True):
+        '''
+            Fill the map, `check_func(endpose, arm_tag)` returns whether the 7-d endpose is reachable by the arm.
+        '''
+        st = time.perf_counter()
+        for arm_id, arm_tag in enumerate(ARM_TAGS):
+            for dir_id, direction in enumerate(self.directions):
+                quat = GRASP_DIRECTION_DIC[direction]
+                for i, x in enumerate(self.xs):
+                    for j, y in enumerate(self.ys):
+                        self.reachable[arm_id, dir_id, i, j] = check_func([x, y, self.height] + list(quat), arm_tag)
+        if log:
+            print(f'reachability map: {self.reachable.size} grasp poses checked in {time.perf_counter() - st:.1f}s, '
+                  f'{self.reachable.mean():.1%} reachable')
+
+    def save(self, save_path):
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        tmp_path = f'{save_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, reachable=self.reachable, meta=json.dumps(self.get_meta()))
+        os.replace(tmp_path, save_path)
+
+    def load(self, save_path) -> bool:
+        '''
+            Load a saved map, False if it is missing or was built over another grid, height or direction list.
+        '''
+        if not os.path.exists(save_path):
+            return False
+        with np.load(save_path) as data:
+            if json.loads(str(data['meta'])) != self.get_meta():
+                return False
+            self.reachable = data['reachable']
+        return True
+
+    def is_reachable(self, x, y, arm_tag = None, directions = None) -> bool:
+        '''
+            Whether some grasp of `directions` (all by default) at (x, y) is reachable by `arm_tag` (either arm by default).
+        '''
+        arm_ids = [ARM_TAGS.index(arm_tag)] if arm_tag is not None else list(range(len(ARM_TAGS)))
+        dir_ids = [self.directions.index(direction) for direction in directions] if directions is not None else list(range(len(self.directions)))
+        i = int(np.clip(np.searchsorted(self.xs, x) - 1, 0, len(self.xs) - 2))
+        j = int(np.clip(np.searchsorted(self.ys, y) - 1, 0, len(self.ys) - 2))
+        return bool(self.reachable[np.ix_(arm_ids, dir_ids, [i, i + 1], [j, j + 1])].any())
+
+def get_reachability_map(embodiment_name, embodiment_args, check_func, height = REACH_HEIGHT) -> ReachabilityMap:
+    '''
+        Reachability map of an embodiment: from this process, else from `.cache/reachability/`, else built with `check_func` and saved.
+    '''
+    save_path = os.path.join(CACHE_PATH, 'reachability', f'{embodiment_name}_{get_embodiment_key(embodiment_args)}_{height:.3f}.npz')
+    if save_path not in _loaded_maps:
+        reach_map = ReachabilityMap(height=height)
+        if not reach_map.load(save_path):
+            print(f'building the reachability map of {embodiment_name}, it is cached in {save_path}')
+            reach_map.build(check_func)
+            reach_map.save(save_path)
+        _loaded_maps[save_path] = reach_map
+    return _loaded_maps[save_path]
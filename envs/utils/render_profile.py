@@ -0,0 +1,80 @@
+import yaml, os
+import sys
+import json
+import platform
+import subprocess
+import sapien.core as sapien
+from envs._GLOBAL_CONFIGS import CONFIGS_PATH, CACHE_PATH, ROOT_PATH
+
+DEFAULT_RENDER_PROFILE = 'rt_final'
+
+def get_render_profile(profile_name = DEFAULT_RENDER_PROFILE) -> dict:
+    render_config_path = os.path.join(CONFIGS_PATH, '_render_config.yml')
+
+    assert os.path.isfile(render_config_path), "render config file is missing"
+
+    with open(render_config_path, 'r', encoding='utf-8') as f:
+        render_args = yaml.load(f.read(), Loader=yaml.FullLoader)
+
+    assert profile_name in render_args, f'render profile {profile_name} is not defined'
+    return render_args[profile_name]
+
+def select_render_profile(render_profile, phase = None) -> str:
+    '''
+        Profile name of a run phase, `render_profile` is a name or a `{phase: name}` map.
+    '''
+    if render_profile is None:
+        return DEFAULT_RENDER_PROFILE
+    if isinstance(render_profile, dict):
+        return render_profile.get(phase, render_profile.get('default', DEFAULT_RENDER_PROFILE))
+    return render_profile
+
+def apply_render_profile(profile: dict):
+    '''
+        Set the global render config, it is used by every camera created afterwards.
+    '''
+    sapien.render.set_camera_shader_dir(profile['shader_dir'])
+    if profile['shader_dir'] == 'rt':
+        sapien.render.set_ray_tracing_samples_per_pixel(profile.get('samples_per_pixel', 32))
+        sapien.render.set_ray_tracing_path_depth(profile.get('path_depth', 8))
+        sapien.render.set_ray_tracing_denoiser(profile.get('denoiser', 'oidn'))
+
+def get_render_probe_key(profile_name) -> str:
+    '''
+        What a successful render probe depends on: the machine, the visible GPUs, the SAPIEN version and the profile.
+    '''
+    return json.dumps({
+        "node": platform.node(),
+        "cuda_visible_devices": os.environ.get('CUDA_VISIBLE_DEVICES'),
+        "sapien": getattr(sapien, '__version__', None),
+        "profile": get_render_profile(profile_name),
+    }, sort_keys=True)
+
+def probe_render(profile_name = DEFAULT_RENDER_PROFILE, use_cache = True) -> bool:
+    '''
+        Check that a renderer with `profile_name` can be created, by running `script/test_render.py` in a subprocess.
+            - The subprocess keeps the throwaway renderer, and a crash of the driver, out of this process.
+            - A success is cached in `.cache/render_probe.json`, so later runs on the same machine skip the probe.
+    '''
+    cache_file = os.path.join(CACHE_PATH, 'render_probe.json')
+    key = get_render_probe_key(profile_name)
+    cache = {}
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+        except ValueError:
+            cache = {}
+    if use_cache and cache.get(key, False):
+        return True
+
+    result = subprocess.run([sys.executable, os.path.join(ROOT_PATH, 'script', 'test_render.py'), profile_name], cwd=ROOT_PATH)
+    if result.returncode != 0:
+        return False
+    cache[key] = True
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, cache_file)
+    return True
@@ -5,7 +5,8 @@ import json
 
 import os
 import pickle
-import open3d as o3d
+from .lazy_import import lazy_import
+o3d = lazy_import('open3d')
 
 def ensure_dir(file_path):
     directory = os.path.dirname(file_path)
@@ -22,10 +23,13 @@ def save_json(save_path, json_file):
     with open(save_path, 'w') as f:
         json.dump(json_file, f, indent=4)
 
-def save_pkl(save_path,dic_file):
+def save_pkl(save_path,dic_file, fsync = False):
     ensure_dir(save_path)
     with open(save_path, 'wb') as f:
         pickle.dump(dic_file, f)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
 
 def save_pcd(save_path, pcd_arr, color = False):
     ensure_dir(save_path)
@@ -0,0 +1,58 @@
+import sapien.core as sapien
+import numpy as np
+
+def _get_articulation(entity):
+    link = entity.find_component_by_type(sapien.physx.PhysxArticulationLinkComponent)
+    return None if link is None else link.articulation
+
+def get_scene_state(scene) -> dict:
+    '''
+        Kinematic state of every entity of the scene.
+            - `entities`: entity names, in `scene.get_entities()` order, used to check the scene on restore.
+            - `poses`: [N, 7] pose (p, q) of every entity that is not an articulation link.
+            - `articulations`: root pose, qpos and qvel of every articulation, in order of first appearance.
+    '''
+    # `seen` holds the articulations so their ids stay valid while the loop runs
+    names, poses, articulations, seen = [], [], [], {}
+    for entity in scene.get_entities():
+        names.append(entity.get_name())
+        articulation = _get_articulation(entity)
+        if articulation is None:
+            pose = entity.get_pose()
+            poses.append(np.concatenate([pose.p, pose.q]))
+            continue
+        poses.append(np.full(7, np.nan))
+        if id(articulation) not in seen:
+            seen[id(articulation)] = articulation
+            root_pose = articulation.get_root_pose()
+            articulations.append({
+                "root_pose": np.concatenate([root_pose.p, root_pose.q]),
+                "qpos": np.array(articulation.get_qpos()),
+                "qvel": np.array(articulation.get_qvel()),
+            })
+    return {
+        "entities": names,
+        "poses": np.array(poses, dtype=np.float32).reshape(-1, 7),
+        "articulations": articulations,
+    }
+
+def set_scene_state(scene, state: dict):
+    '''
+        Restore a state from `get_scene_state` without stepping physics.
+    '''
+    entities = scene.get_entities()
+    if [entity.get_name() for entity in entities] != state['entities']:
+        raise ValueError('scene entities do not match the recorded state')
+    seen = {}
+    for entity, pose in zip(entities, state['poses']):
+        articulation = _get_articulation(entity)
+        if articulation is None:
+            entity.set_pose(sapien.Pose(pose[:3], pose[3:]))
+        elif id(articulation) not in seen:
+            seen[id(articulation)] = articulation
+    for articulation, articulation_state in zip(seen.values(), state['articulations']):
+        root_pose = articulation_state['root_pose']
+        articulation.set_root_pose(sapien.Pose(root_pose[:3], root_pose[3:]))
+        articulation.set_qpos(articulation_state['qpos'])
+        if 'qvel' in articulation_state:
+            articulation.set_qvel(articulation_state['qvel'])
@@ -0,0 +1,129 @@
+import math
+import numpy as np
+
+# table top, in world coordinates
+TABLE_XLIM = (-0.6, 0.6)
+TABLE_YLIM = (-0.35, 0.35)
+TABLE_CELL_SIZE = 0.05
+# query windows are grown by this much, so a rounding error at a cell border cannot skip a cell
+CELL_MARGIN = 1e-9
+
+DISC, RECT = 0, 1
+
+class TableOccupancyGrid():
+    '''
+        Uniform hash grid over the table of the footprints already placed on it.
+            - Discs (x, y, radius): objects of `size_dict`. Rectangles (x1, y1, x2, y2): `prohibited_area`.
+            - A footprint is registered in every cell its bounding box covers, cells outside the table are clamped to the border,
+              so `is_free` only tests the footprints of the few cells around the query.
+            - `is_free(x, y, radius)` is exact: a disc of `radius` is free if it is farther than `radius` from every rectangle
+              and its center is farther than `radius + R` from every disc center, the tests of `rand_pose_messy`.
+    '''
+    def __init__(self, xlim = TABLE_XLIM, ylim = TABLE_YLIM, cell_size = TABLE_CELL_SIZE):
+        self.origin = np.array([xlim[0], ylim[0]], dtype=np.float64)
+        self.cell_size = cell_size
+        self.shape = (max(1, math.ceil((xlim[1] - xlim[0]) / cell_size)), max(1, math.ceil((ylim[1] - ylim[0]) / cell_size)))
+        self.clear()
+
+    def clear(self):
+        self.kinds = []
+        self.params = [] # disc: [x, y, radius, 0], rect: [x1, y1, x2, y2]
+        self.tags = []
+        self.cells = {}
+        self._near = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def _cell_range(self, lo, hi, axis):
+        i0 = int(math.floor((lo - self.origin[axis]) / self.cell_size))
+        i1 = int(math.floor((hi - self.origin[axis]) / self.cell_size))
+        n = self.shape[axis]
+        return min(max(i0, 0), n - 1), min(max(i1, 0), n - 1)
+
+    def _cells_of_box(self, x1, y1, x2, y2):
+        ix0, ix1 = self._cell_range(x1, x2, 0)
+        iy0, iy1 = self._cell_range(y1, y2, 1)
+        return [(i, j) for i in range(ix0, ix1 + 1) for j in range(iy0, iy1 + 1)]
+
+    def _insert(self, kind, params, box, tag):
+        shape_id = len(self.kinds)
+        self.kinds.append(kind)
+        self.params.append([float(value) for value in params])
+        self.tags.append(tag)
+        for cell in self._cells_of_box(*box):
+            self.cells.setdefault(cell, []).append(shape_id)
+        self._near = {}
+        return shape_id
+
+    def add_disc(self, x, y, radius, tag = None):
+        return self._insert(DISC, [x, y, radius, 0.], [x - radius, y - radius, x + radius, y + radius], tag)
+
+    def add_rect(self, x1, y1, x2, y2, tag = None):
+        return self._insert(RECT, [x1, y1, x2, y2], [x1, y1, x2, y2], tag)
+
+    def _overlap(self, shape_id, x, y, radius) -> bool:
+        a, b, c, d = self.params[shape_id]
+        if self.kinds[shape_id] == DISC:
+            return not math.sqrt((a - x) ** 2 + (b - y) ** 2) > c + radius
+        dx = max(a - x, x - c, 0)
+        dy = max(b - y, y - d, 0)
+        return dx * dx + dy * dy <= radius * radius
+
+    def is_free(self, x, y, radius = 0.) -> bool:
+        x, y, radius = float(x), float(y), float(radius)
+        seen = set()
+        margin = radius + CELL_MARGIN
+        for cell in self._cells_of_box(x - margin, y - margin, x + margin, y + margin):
+            for shape_id in self.cells.get(cell, ()):
+                if shape_id in seen:
+                    continue
+                seen.add(shape_id)
+                if self._overlap(shape_id, x, y, radius):
+                    return False
+        return True
+
+    def _get_near_table(self, radius) -> np.ndarray:
+        '''
+            [X, Y, K] ids of the footprints that a disc of `radius` centered in each cell can touch, padded with -1.
+            Built once per radius until the next insert.
+        '''
+        if radius not in self._near:
+            near = [[[] for _ in range(self.shape[1])] for _ in range(self.shape[0])]
+            for i in range(self.shape[0]):
+                for j in range(self.shape[1]):
+                    lo = self.origin + np.array([i, j]) * self.cell_size - radius - CELL_MARGIN
+                    hi = lo + self.cell_size + 2 * (radius + CELL_MARGIN)
+                    ids = set()
+                    for cell in self._cells_of_box(lo[0], lo[1], hi[0], hi[1]):
+                        ids.update(self.cells.get(cell, ()))
+                    near[i][j] = sorted(ids)
+            width = max(1, max(len(ids) for row in near for ids in row))
+            table = np.full((*self.shape, width), -1, dtype=np.int64)
+            for i in range(self.shape[0]):
+                for j in range(self.shape[1]):
+                    table[i, j, :len(near[i][j])] = near[i][j]
+            self._near[radius] = table
+        return self._near[radius]
+
+    def free_mask(self, x, y, radius = 0.) -> np.ndarray:
+        '''
+            Vectorized `is_free` of [N] candidate centers, each tested against the footprints near its cell only.
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(self.kinds) == 0:
+            return np.ones(len(x), dtype=bool)
+        ix = np.clip(np.floor((x - self.origin[0]) / self.cell_size), 0, self.shape[0] - 1).astype(np.int64)
+        iy = np.clip(np.floor((y - self.origin[1]) / self.cell_size), 0, self.shape[1] - 1).astype(np.int64)
+        ids = self._get_near_table(radius)[ix, iy] # [N, K]
+        valid_id = ids >= 0
+        params = np.array(self.params, dtype=np.float64)[np.maximum(ids, 0)] # [N, K, 4]
+        is_disc = np.array(self.kinds, dtype=np.int64)[np.maximum(ids, 0)] == DISC
+        a, b, c, d = params[..., 0], params[..., 1], params[..., 2], params[..., 3]
+        x, y = x[:, None], y[:, None]
+        disc_free = np.sqrt((a - x) ** 2 + (b - y) ** 2) > c + radius
+        dx = np.maximum(np.maximum(a - x, x - c), 0)
+        dy = np.maximum(np.maximum(b - y, y - d), 0)
+        rect_free = dx * dx + dy * dy > radius * radius
+        return np.all(~valid_id | np.where(is_disc, disc_free, rect_free), axis=1)
@@ -0,0 +1,76 @@
+import os
+import pickle
+import numpy as np
+
+# a cached plan is replayed only if the robot starts where it started when the plan was recorded
+TRAJ_QPOS_TOL = 1e-3
+TRAJ_TARGET_TOL = 1e-4
+# keys of a planner result that are needed to execute it
+ARM_RESULT_KEYS = ('status', 'position', 'velocity')
+
+class TrajectoryCache():
+    '''
+        Planner results of one seed, recorded by the seed-search pass and replayed by the collection pass.
+            - `mode`: "record" plans and keeps every result, "replay" returns the recorded results.
+            - Entries are kept in call order. On replay, the entry with the same call index is used only if
+              its kind, arm, start state and target match the current call, otherwise the call is planned again (a miss).
+    '''
+    def __init__(self, cache_dir, seed, mode = 'record'):
+        self.save_path = os.path.join(cache_dir, f'seed{seed}.pkl')
+        self.mode = mode
+        self.entries = []
+        self.call_id = 0
+        self.hit_num = 0
+        self.miss_num = 0
+        if mode == 'replay' and os.path.exists(self.save_path):
+            with open(self.save_path, 'rb') as f:
+                self.entries = pickle.load(f)
+
+    @staticmethod
+    def _match(entry, kind, arm_tag, now, target) -> bool:
+        if entry['kind'] != kind or entry['arm'] != arm_tag:
+            return False
+        if entry['now'].shape != now.shape or entry['target'].shape != target.shape:
+            return False
+        return np.allclose(entry['now'], now, atol=TRAJ_QPOS_TOL) and np.allclose(entry['target'], target, atol=TRAJ_TARGET_TOL)
+
+    def get_plan(self, kind, arm_tag, now, target, plan_func):
+        '''
+            Return the plan of call `kind` ("arm" or "gripper") of `arm_tag` from `now` to `target`.
+                `plan_func()` computes it when there is no matching entry.
+        '''
+        now = np.array(now, dtype=np.float64).reshape(-1)
+        target = np.array(target, dtype=np.float64).reshape(-1)
+        call_id = self.call_id
+        self.call_id += 1
+
+        if self.mode == 'replay':
+            entry = self.entries[call_id] if call_id < len(self.entries) else None
+            if entry is not None and self._match(entry, kind, arm_tag, now, target):
+                self.hit_num += 1
+                return dict(entry['result'])
+            self.miss_num += 1
+            return plan_func()
+
+        result = plan_func()
+        if kind == 'arm':
+            saved_result = {key: result[key] for key in ARM_RESULT_KEYS if key in result}
+        else:
+            saved_result = dict(result)
+        self.entries.append({'kind': kind, 'arm': arm_tag, 'now': now, 'target': target, 'result': saved_result})
+        return result
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.save_path), exist_ok=True)
+        tmp_path = self.save_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.entries, f)
+        os.replace(tmp_path, self.save_path)
+
+    def get_stats(self) -> dict:
+        plan_num = self.hit_num + self.miss_num
+        return {
+            "hit_num": self.hit_num,
+            "miss_num": self.miss_num,
+            "hit_rate": self.hit_num / plan_num if plan_num > 0 else 0.,
+        }
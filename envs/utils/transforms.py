@@ -1,9 +1,9 @@
-import cv2
 import scipy
 import sapien
 import numpy as np
 import transforms3d as t3d
-from scipy.ndimage import gaussian_filter
+from .lazy_import import lazy_import
+cv2 = lazy_import('cv2')
 
 def transform_pts(pts:np.ndarray, RT:np.ndarray):
     '''
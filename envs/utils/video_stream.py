@@ -0,0 +1,86 @@
+import subprocess
+import json
+import numpy as np
+from .save_file import ensure_dir
+
+class VideoStreamWriter():
+    '''
+        Encode a camera's RGB frames into a video file through an ffmpeg subprocess.
+            - Frames are written in capture order, so video frame i is capture index i of the episode.
+            - A short GOP keeps seeking cheap for `VideoFrameReader.get_frame`.
+    '''
+    def __init__(self, save_path, width, height, fps = 30, crf = 18, gop = 15):
+        ensure_dir(save_path)
+        self.save_path = save_path
+        self.width, self.height, self.fps = width, height, fps
+        self.frame_num = 0
+        self.ffmpeg = subprocess.Popen([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pixel_format', 'rgb24',
+                '-video_size', f'{width}x{height}', '-framerate', str(fps),
+                '-i', '-',
+                '-pix_fmt', 'yuv420p', '-vcodec', 'libx264',
+                '-crf', str(crf), '-g', str(gop),
+                save_path
+            ], stdin=subprocess.PIPE)
+
+    def write(self, rgb: np.ndarray):
+        if rgb.shape != (self.height, self.width, 3):
+            raise ValueError(f'frame shape {rgb.shape} does not match video {(self.height, self.width, 3)}')
+        self.ffmpeg.stdin.write(np.ascontiguousarray(rgb, dtype=np.uint8).tobytes())
+        self.frame_num += 1
+
+    def close(self):
+        self.ffmpeg.stdin.close()
+        if self.ffmpeg.wait() != 0:
+            raise RuntimeError(f'ffmpeg failed to encode {self.save_path}')
+
+    def get_meta(self) -> dict:
+        return {
+            "path": self.save_path,
+            "width": self.width,
+            "height": self.height,
+            "fps": self.fps,
+            "frame_num": self.frame_num,
+        }
+
+def save_video_meta(save_path, writers: dict):
+    '''
+        Write `{camera_name: meta}` of an episode's video streams next to them.
+    '''
+    ensure_dir(save_path)
+    with open(save_path, 'w') as f:
+        json.dump({name: writer.get_meta() for name, writer in writers.items()}, f, indent=4)
+
+class VideoFrameReader():
+    '''
+        Decode frames of a video written by `VideoStreamWriter`.
+            - `get_frame(i)` seeks to capture index i.
+            - `read_all()` decodes the whole stream into [N, H, W, 3] uint8.
+    '''
+    def __init__(self, save_path, width, height, fps = 30):
+        self.save_path = save_path
+        self.width, self.height, self.fps = width, height, fps
+
+    @classmethod
+    def from_meta(cls, meta: dict):
+        return cls(meta['path'], meta['width'], meta['height'], meta['fps'])
+
+    def _decode(self, input_args, frame_num = None):
+        cmd = ['ffmpeg', '-loglevel', 'error'] + input_args + ['-i', self.save_path]
+        if frame_num is not None:
+            cmd += ['-frames:v', str(frame_num)]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        raw = subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, self.height, self.width, 3)
+
+    def get_frame(self, index) -> np.ndarray:
+        # seek half a frame early so rounding of the timestamps cannot skip the wanted frame
+        seek_time = max(index - 0.5, 0) / self.fps
+        frames = self._decode(['-ss', f'{seek_time:.6f}'], frame_num=1)
+        if len(frames) == 0:
+            raise IndexError(f'frame {index} out of range of {self.save_path}')
+        return frames[0]
+
+    def read_all(self) -> np.ndarray:
+        return self._decode([])
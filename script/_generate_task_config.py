@@ -27,21 +27,43 @@ for task_name in names:
         'collect_wrist_camera': True,
         'data_type':{
             'rgb': True,
+            'rgb_video': False,
             'observer': False,
             'depth': True,
             'pointcloud': True,
             'endpose': False,
             'qpos': True,
             'mesh_segmentation': False,
-            'actor_segmentation': False
+            'actor_segmentation': False,
+            'depth_dtype': 'float64',
+            'depth_scale': 1000,
+            'pcd_dtype': None,
+            'segmentation_format': 'palette',
+            'segmentation_dtype': 'uint16'
         },
         'use_seed': False,
         'dual_arm': True,
         'save_path': './data',
         'pcd_down_sample_num': 1024,
         'pcd_crop': True,
+        'pcd_backend': 'auto',
+        'pcd_voxel_size': 0,
         'save_freq': 15,
-        'st_episode': 0
+        'save_format': 'pkl',
+        'async_save': False,
+        'save_queue_size': 32,
+        'worker_num': 1,
+        'screen_mode': True,
+        'reuse_scene': False,
+        'asset_cache_size': 256,
+        'reachability_check': False,
+        'parallel_plan': False,
+        'speculative_plan': True,
+        'plan_cache': False,
+        'render_profile': {'search': 'fast', 'collect': 'rt_final'},
+        'use_traj_cache': False,
+        'record_state': False,
+        'replay_state': None
     }
     with open(task_config_path, 'w') as f:
         yaml.dump(data,f,default_flow_style = False,sort_keys=False)
\ No newline at end of file
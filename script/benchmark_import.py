@@ -0,0 +1,63 @@
+import sys
+sys.path.append('./')
+import os
+import re
+import json
+import argparse
+import subprocess
+import numpy as np
+
+# modules that should only be imported when the subsystem that needs them is used
+HEAVY_MODULES = ['torch', 'open3d', 'cv2', 'trimesh', 'pytorch3d', 'zarr', 'warp', 'sapienipc', 'coacd']
+
+def measure(statement, repeat):
+    '''
+        Cold-start cost of `statement`, each run in a fresh interpreter.
+            - `wall`: wall time of the statement in ms, measured inside the child.
+            - `top`: the slowest top-level imports of the last run, from `python -X importtime`.
+            - `heavy`: the modules of HEAVY_MODULES that the statement imported.
+    '''
+    code = (
+        'import time, sys, json\n'
+        'st = time.perf_counter()\n'
+        f'{statement}\n'
+        'cost = (time.perf_counter() - st) * 1000\n'
+        f'print(json.dumps({{"wall": cost, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n'
+    )
+    walls = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'"{statement}" failed:\n{result.stderr[-2000:]}')
+        info = json.loads(result.stdout.strip().splitlines()[-1])
+        walls.append(info['wall'])
+
+    top = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        # top-level imports only, their cumulative time includes their children
+        if match is not None and len(match.group(3)) == 1:
+            top.append((int(match.group(2)) / 1000, match.group(4)))
+    top.sort(reverse=True)
+    return {"wall": walls, "top": top, "heavy": info['heavy']}
+
+def report(name, result, top_num):
+    walls = np.array(result['wall'])
+    print(f'{name}: median {np.median(walls):.0f} ms, min {walls.min():.0f} ms over {len(walls)} runs')
+    print(f'    heavy modules imported: {", ".join(result["heavy"]) if result["heavy"] else "none"}')
+    for cost, module in result['top'][:top_num]:
+        print(f'    {cost:8.1f} ms  {module}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start import cost of envs and of a task entry point')
+    parser.add_argument('--task_name', type=str, default='empty_cup_place')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='number of slowest top-level imports to show')
+    args = parser.parse_args()
+
+    report('import envs', measure('import envs', args.repeat), args.top)
+    entry = f'import envs.{args.task_name}; getattr(envs.{args.task_name}, "{args.task_name}")()'
+    report(f'task entry point ({args.task_name})', measure(entry, args.repeat), args.top)
+
+if __name__ == "__main__":
+    main()
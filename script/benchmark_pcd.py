@@ -0,0 +1,81 @@
+import sys
+sys.path.append('./')
+import time
+import argparse
+import numpy as np
+import torch
+from envs.camera.camera import get_camera_pcd_numpy, get_camera_pcd_torch
+
+class _Picture():
+    def __init__(self, tensor):
+        self.tensor = tensor
+
+    def torch(self):
+        return self.tensor
+
+class SyntheticCamera():
+    '''
+        Stand-in for a SAPIEN camera with a random picture, so the point-cloud backends can be timed without rendering.
+    '''
+    def __init__(self, width, height, valid_ratio = 0.7, seed = 0):
+        rng = np.random.default_rng(seed)
+        self.width, self.height = width, height
+        self.position = rng.uniform(-1, 1, (height, width, 4)).astype(np.float32)
+        self.position[..., 2] -= 1.5
+        self.position[..., 3] = (rng.random((height, width)) > valid_ratio).astype(np.float32)
+        self.color = rng.random((height, width, 4)).astype(np.float32)
+        self.model_matrix = np.eye(4, dtype=np.float32)
+        self.model_matrix[:3, 3] = [0, 0, 1.2]
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.pictures_torch = {
+            "Position": torch.from_numpy(self.position).to(device),
+            "Color": torch.from_numpy(self.color).to(device),
+        }
+
+    def get_name(self):
+        return 'synthetic'
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_picture(self, name):
+        return self.position if name == "Position" else self.color
+
+    def get_picture_cuda(self, name):
+        return _Picture(self.pictures_torch[name])
+
+    def get_model_matrix(self):
+        return self.model_matrix
+
+def benchmark(func, repeat):
+    func()
+    st = time.perf_counter()
+    for _ in range(repeat):
+        res = func()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return (time.perf_counter() - st) / repeat * 1000, res
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the torch and numpy point-cloud backends of Camera.get_pcd')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    camera = SyntheticCamera(args.width, args.height)
+    crop_bbox = [[-0.6, -0.35, 0.7401], [0.6, 0.35, 2]]
+    buffer = np.empty((args.width * args.height, 6), dtype=np.float32)
+
+    numpy_ms, numpy_pcd = benchmark(lambda: get_camera_pcd_numpy(camera, crop_bbox, buffer), args.repeat)
+    torch_ms, torch_pcd = benchmark(lambda: get_camera_pcd_torch(camera, crop_bbox), args.repeat)
+    print(f'{args.width}x{args.height}, {len(numpy_pcd)} points after crop')
+    print(f'numpy: {numpy_ms:.2f} ms / frame')
+    print(f'torch ({"cuda" if torch.cuda.is_available() else "cpu"}): {torch_ms:.2f} ms / frame')
+    print(f'max abs difference: {np.abs(numpy_pcd - torch_pcd).max() if len(numpy_pcd) else 0.:.2e}')
+
+if __name__ == "__main__":
+    main()
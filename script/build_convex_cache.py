@@ -0,0 +1,68 @@
+import sys
+sys.path.append('./')
+import os
+import re
+import time
+import argparse
+import multiprocessing as mp
+from envs.utils.asset_registry import ASSET_DIR, ASSET_REGISTRY
+from envs.utils.convex_cache import get_convex_hull_file, get_convex_cache_file, set_convex_decomposition, get_decomposition_method
+
+def list_jobs(asset_dir):
+    '''
+        (collision file, scale) of every model and model id of `asset_dir`, the scale read from its `model_data{id}.json`.
+    '''
+    jobs = []
+    for modelname in sorted(os.listdir(asset_dir)):
+        modeldir = os.path.join(asset_dir, modelname)
+        if not os.path.isdir(modeldir):
+            continue
+        model_ids = [re.fullmatch(r'model_data(\d*)\.json', file_name) for file_name in os.listdir(modeldir)]
+        model_ids = [None if match.group(1) == '' else int(match.group(1)) for match in model_ids if match is not None]
+        for model_id in model_ids or [None]:
+            collision_file, _ = ASSET_REGISTRY.get_model_files(modelname, model_id)
+            if collision_file is None:
+                continue
+            json_file_path = os.path.join(modeldir, 'model_data.json' if model_id is None else f'model_data{model_id}.json')
+            model_data = ASSET_REGISTRY.get_model_data(json_file_path)
+            scale = model_data['scale'] if model_data is not None and 'scale' in model_data else (1, 1, 1)
+            jobs.append((collision_file, tuple(scale)))
+    return jobs
+
+def build_job(job):
+    collision_file, scale, method = job
+    st = time.perf_counter()
+    hull_file = get_convex_hull_file(collision_file, scale, method)
+    return collision_file, hull_file, time.perf_counter() - st
+
+def main():
+    parser = argparse.ArgumentParser(description='Prebuild the convex hull cache of every model of assets/objects')
+    parser.add_argument('--method', type=str, default='coacd', choices=['coacd'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help='rebuild hulls that are already cached')
+    args = parser.parse_args()
+    set_convex_decomposition(args.method)
+    if get_decomposition_method() == 'none':
+        raise SystemExit('coacd is not installed, nothing to build')
+
+    jobs = list_jobs(ASSET_DIR)
+    if args.force:
+        for collision_file, scale in jobs:
+            cache_file = get_convex_cache_file(collision_file, scale, args.method)
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+    print(f'{len(jobs)} collision meshes, {args.workers} workers')
+
+    st = time.perf_counter()
+    fail_num = 0
+    with mp.get_context('spawn').Pool(args.workers) as pool:
+        for collision_file, hull_file, cost in pool.imap_unordered(build_job, [(*job, args.method) for job in jobs]):
+            if hull_file is None:
+                fail_num += 1
+                print(f'failed: {collision_file}')
+            else:
+                print(f'{cost:6.2f}s {hull_file}')
+    print(f'done in {time.perf_counter() - st:.1f}s, {len(jobs) - fail_num} built, {fail_num} failed')
+
+if __name__ == "__main__":
+    main()
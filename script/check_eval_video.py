@@ -0,0 +1,62 @@
+import sys
+sys.path.append('./')
+import argparse
+import tempfile
+import numpy as np
+from script.run_task import class_decorator, load_task_args
+
+class FrameSink():
+    '''
+        Stands in for the ffmpeg process of the eval video, keeps the frames written to its stdin.
+    '''
+    def __init__(self):
+        self.stdin = self
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(bytes(data))
+
+    def close(self):
+        pass
+
+    def wait(self):
+        return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Take several actions per observation with the eval video on, as chunked policies do')
+    parser.add_argument('--task_name', type=str, default='empty_cup_place')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--obs_num', type=int, default=16)
+    parser.add_argument('--actions_per_obs', type=int, default=2)
+    args = parser.parse_args()
+
+    task_args = load_task_args(args.task_name)
+    task_args.update({'screen_mode': True, 'render_freq': 0, 'eval_video_save_dir': tempfile.mkdtemp()})
+    TASK_ENV = class_decorator(args.task_name)
+    TASK_ENV.setup_demo(now_ep_num=0, seed=args.seed, **task_args)
+    sink = FrameSink()
+    TASK_ENV._set_eval_video_ffmpeg(sink)
+
+    expected = []
+    try:
+        for _ in range(args.obs_num):
+            obs = TASK_ENV.get_obs()
+            head_rgb = obs['observation']['head_camera']['rgb']
+            # hold the arms where they are, every action steps the scene
+            action = obs['joint_action']
+            for _ in range(args.actions_per_obs):
+                if TASK_ENV.take_action_cnt % 15 == 0:
+                    expected.append(head_rgb.tobytes())
+                TASK_ENV.take_action(action)
+    finally:
+        TASK_ENV._del_eval_video_ffmpeg()
+        TASK_ENV.close()
+
+    match = sink.frames == expected
+    print(f'{args.obs_num} observations, {args.actions_per_obs} actions each: '
+          f'{len(sink.frames)} eval video frames, {len(expected)} expected -> {"match" if match else "MISMATCH"}')
+    if not match:
+        raise SystemExit('the eval video does not record the head frame of the last observation')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+sys.path.append('./')
+import argparse
+import numpy as np
+from copy import deepcopy
+from script.run_task import class_decorator, load_task_args
+
+def run_seed(TASK_ENV, args, seed):
+    '''
+        Play one seed, returns the state after `setup_demo`, the qpos of both arms after every physics step and the success.
+    '''
+    TASK_ENV.setup_demo(now_ep_num=0, seed=seed, **args)
+    start_state = TASK_ENV.get_state()
+    trajectory = []
+    step = TASK_ENV._step
+    def record_step():
+        step()
+        trajectory.append(np.concatenate([TASK_ENV.robot.left_entity.get_qpos(), TASK_ENV.robot.right_entity.get_qpos()]))
+    TASK_ENV._step = record_step
+    try:
+        TASK_ENV.play_once()
+        success = bool(TASK_ENV.plan_success and TASK_ENV.check_success())
+    finally:
+        del TASK_ENV._step
+        TASK_ENV.close()
+    return start_state, np.array(trajectory), success
+
+def state_diff(state_a, state_b) -> float:
+    scene_a, scene_b = state_a['scene'], state_b['scene']
+    if scene_a['entities'] != scene_b['entities']:
+        return np.inf
+    diff = np.nanmax(np.abs(scene_a['poses'] - scene_b['poses']), initial=0.)
+    for articulation_a, articulation_b in zip(scene_a['articulations'], scene_b['articulations']):
+        for key in ('root_pose', 'qpos', 'qvel'):
+            diff = max(diff, np.abs(articulation_a[key] - articulation_b[key]).max())
+    return float(diff)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare seeds played in a fresh scene and in a reused (reset-in-place) scene')
+    parser.add_argument('--task_name', type=str, default='empty_cup_place')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--planner', type=str, default='mplib_screw',
+                        help='planner of both arms, RRT plans are randomized and differ between any two runs')
+    args = parser.parse_args()
+
+    task_args = load_task_args(args.task_name)
+    task_args.update({'screen_mode': True, 'render_freq': 0, 'use_traj_cache': False, 'parallel_plan': False})
+    for key in ('left_embodiment_config', 'right_embodiment_config'):
+        task_args[key] = deepcopy(task_args[key])
+        task_args[key]['planner'] = args.planner
+
+    fresh_args = dict(task_args, reuse_scene=False)
+    reused_args = dict(task_args, reuse_scene=True)
+    reused_env = class_decorator(args.task_name)
+    # the first episode of an instance always builds the scene
+    run_seed(reused_env, reused_args, max(args.seeds) + 1)
+
+    all_match = True
+    for seed in args.seeds:
+        fresh = run_seed(class_decorator(args.task_name), fresh_args, seed)
+        reused = run_seed(reused_env, reused_args, seed)
+        assert reused_env.scene_reused, 'the scene was rebuilt, check that the config allows reset-in-place'
+        start_diff = state_diff(fresh[0], reused[0])
+        step_num = min(len(fresh[1]), len(reused[1]))
+        traj_diff = float(np.abs(fresh[1][:step_num] - reused[1][:step_num]).max()) if step_num > 0 else 0.
+        match = start_diff < 1e-6 and len(fresh[1]) == len(reused[1]) and traj_diff < 1e-4 and fresh[2] == reused[2]
+        all_match = all_match and match
+        print(f'seed {seed}: start state diff {start_diff:.2e}, steps {len(fresh[1])} / {len(reused[1])}, '
+              f'max qpos diff {traj_diff:.2e}, success {fresh[2]} / {reused[2]} -> {"match" if match else "MISMATCH"}')
+    if not all_match:
+        raise SystemExit('reused scenes do not reproduce fresh builds for this task')
+
+if __name__ == "__main__":
+    main()
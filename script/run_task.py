@@ -1,7 +1,7 @@
 import sys
 sys.path.append('./')
 import sapien.core as sapien
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import pdb
 from envs import *
 import yaml
@@ -9,6 +9,9 @@ import importlib
 import json
 import traceback
 import os
+import queue
+import time
+import multiprocessing as mp
 
 current_file_path = os.path.abspath(__file__)
 parent_directory = os.path.dirname(current_file_path)
@@ -22,10 +25,10 @@ def class_decorator(task_name):
         raise SystemExit("No such task")
     return env_instance
     
-def main():
-    task_name = input()
-    #task_name = 'empty_cup_place'
-    task = class_decorator(task_name)
+def load_task_args(task_name):
+    '''
+        Config of `task_name` from `task_config/`, with the files and configs of its embodiment.
+    '''
     task_config_path = f'./task_config/{task_name}.yml'
 
     assert os.path.isfile(task_config_path), "task config file is missing"
@@ -73,58 +76,249 @@ def main():
         embodiment_name = str(embodiment_type[0])
     else:
         embodiment_name = str(embodiment_type[0]) + '_' + str(embodiment_type[1])
-        
+
+    args['embodiment_name'] = embodiment_name
+    return args
+
+def main():
+    task_name = input()
+    #task_name = 'empty_cup_place'
+    task = class_decorator(task_name)
+    args = load_task_args(task_name)
+    embodiment_name = args['embodiment_name']
+
     # output camera config
     print('============= Config =============\n')
     print('Messy Table: ' + str(args['messy_table']))
     print('Random Texture: ' + str(args['random_texture']))
+    print('Screen Mode: ' + str(args.get('screen_mode', False)))
     print('Head Camera Config: '+ str(args['head_camera_type']) + f', ' + str(args['collect_head_camera']))
     print('Wrist Camera Config: '+ str(args['wrist_camera_type']) + f', ' + str(args['collect_wrist_camera']))
     print('Embodiment Config:: '+ embodiment_name)
     print('\n=======================================')
 
-    args['embodiment_name'] = embodiment_name
     args['save_path'] += '/' + str(args['task_name']) + '_' + str(args['head_camera_type'])
+    # the collection pass renders with the most demanding profile, check it once per machine
+    if not probe_render(select_render_profile(args.get('render_profile'), 'collect')):
+        raise SystemExit('render error')
     run(task, args)
 
 
-def run(TASK_ENV, args):
-    epid = 0       
-    seed_list=[]   
-    suc_num = 0    
+def screen_seed(TASK_ENV, args, seed, ep_num):
+    '''
+        Run one seed-search episode and report whether it succeeded.
+    '''
+    try:
+        TASK_ENV.setup_demo(now_ep_num=ep_num, seed = seed, **args)
+        TASK_ENV.play_once()
+        success = bool(TASK_ENV.plan_success and TASK_ENV.check_success())
+        if success:
+            if TASK_ENV.traj_cache is not None:
+                TASK_ENV.traj_cache.save()
+            print(f"simulate data episode {ep_num} success! (seed = {seed})")
+        else:
+            print(f"simulate data episode {ep_num} fail! (seed = {seed})   ")
+    except Exception as e:
+        stack_trace = traceback.format_exc()
+        print(' -------------')
+        print(f"simulate data episode {ep_num} fail! (seed = {seed})   ")
+        print('Error: ', stack_trace)
+        print(' -------------')
+        success = False
+    TASK_ENV.close()
+    if (args['render_freq']):
+        TASK_ENV.viewer.close()
+    return success
+
+def collect_episode(TASK_ENV, args, ep_id, seed):
+    '''
+        Replay a screened seed with saving enabled.
+            With `replay_state` set, the episode is re-rendered from its recorded states instead of played.
+            Returns the `play_once` info and the manifest fields (timings, data path, frame number).
+    '''
+    timings = {}
+    st = time.time()
+    TASK_ENV.setup_demo(now_ep_num=ep_id, seed = seed, **args)
+    timings['setup'] = time.time() - st
+    st = time.time()
+    if args.get('replay_state'):
+        info = TASK_ENV.replay_render(os.path.join(args['replay_state'], f'episode{ep_id}.pkl'))
+    else:
+        info = TASK_ENV.play_once()
+        if TASK_ENV.record_state:
+            TASK_ENV.save_state_record(info)
+    timings['play'] = time.time() - st
+    st = time.time()
+    TASK_ENV.close()
+    timings['close'] = time.time() - st
+    meta = {
+        "timings": timings,
+        "data_path": TASK_ENV.get_episode_data_path(),
+        "frame_num": TASK_ENV.PCD_INDEX,
+    }
+    if TASK_ENV.traj_cache is not None:
+        meta['traj_cache'] = TASK_ENV.traj_cache.get_stats()
+        print(f"trajectory cache: {meta['traj_cache']['hit_num']} plans replayed, {meta['traj_cache']['miss_num']} planned")
+    return info, meta
+
+def episode_worker(worker_id, args, job_queue, result_queue):
+    '''
+        Worker process of the episode farm.
+            - Builds its own task instance (and SAPIEN scene) and takes jobs from its `job_queue` until a `None` arrives.
+            - Jobs are `('screen', ep_num, seed)` or `('collect', ep_id, seed)`.
+    '''
+    TASK_ENV = class_decorator(args['task_name'])
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        if job[0] == 'screen':
+            result = screen_seed(TASK_ENV, args, job[2], job[1])
+        else:
+            try:
+                result = collect_episode(TASK_ENV, args, job[1], job[2])
+            except Exception as e:
+                result = traceback.format_exc()
+                print(f"collect episode {job[1]} error (seed = {job[2]}): ", result)
+        result_queue.put(('done', worker_id, job, result))
+
+class EpisodeFarm():
+    '''
+        Pool of `episode_worker` processes, each fed one job at a time through its own job queue.
+            - Processes are started with `spawn`, SAPIEN / CUDA state must not be forked.
+            - The parent knows which job every worker runs from the moment it hands it out,
+              so a job whose worker dies is always reported back, as a `None` result, and the worker is replaced.
+    '''
+    def __init__(self, args, worker_num):
+        self.args = args
+        self.worker_num = worker_num
+        self.ctx = mp.get_context('spawn')
+        self.result_queue = self.ctx.Queue()
+        self.job_queues = {}
+        self.workers = {}
+        self.waiting_jobs = deque()
+        self.running_jobs = {}
+        self.pending = 0
+        for worker_id in range(worker_num):
+            self._start_worker(worker_id)
+
+    def _start_worker(self, worker_id):
+        # a new queue, jobs left in the queue of a dead worker must not be run twice
+        self.job_queues[worker_id] = self.ctx.Queue()
+        worker = self.ctx.Process(target=episode_worker, args=(worker_id, self.args, self.job_queues[worker_id], self.result_queue), daemon=True)
+        worker.start()
+        self.workers[worker_id] = worker
+
+    def _dispatch(self):
+        for worker_id in self.workers:
+            if len(self.waiting_jobs) == 0:
+                break
+            if worker_id not in self.running_jobs:
+                job = self.waiting_jobs.popleft()
+                self.running_jobs[worker_id] = job
+                self.job_queues[worker_id].put(job)
+
+    def submit(self, job):
+        self.waiting_jobs.append(job)
+        self.pending += 1
+        self._dispatch()
+
+    def get_result(self):
+        '''
+            Block until one job finishes, return `(job, result)`.
+        '''
+        while True:
+            try:
+                tag, worker_id, job, result = self.result_queue.get(timeout=5)
+            except queue.Empty:
+                for worker_id, worker in list(self.workers.items()):
+                    if worker.is_alive():
+                        continue
+                    print(f'\nworker {worker_id} exited with code {worker.exitcode}, restarting')
+                    self._start_worker(worker_id)
+                    job = self.running_jobs.pop(worker_id, None)
+                    self._dispatch()
+                    if job is not None:
+                        self.pending -= 1
+                        return job, None
+                continue
+            # a reply of a job already reported with its dead worker
+            if self.running_jobs.get(worker_id) != job:
+                continue
+            self.running_jobs.pop(worker_id)
+            self.pending -= 1
+            self._dispatch()
+            return job, result
+
+    def close(self, wait = True):
+        if wait:
+            for worker_id in self.workers:
+                self.job_queues[worker_id].put(None)
+            for worker in self.workers.values():
+                worker.join()
+        else:
+            for worker in self.workers.values():
+                worker.terminate()
+                worker.join()
+        self.workers = {}
+
+def search_seeds(TASK_ENV, args):
+    seed_list = []
+    suc_num = 0
     fail_num = 0
+    epid = 0
+    while suc_num < args['episode_num']:
+        if screen_seed(TASK_ENV, args, epid, suc_num):
+            seed_list.append(epid)
+            suc_num += 1
+        else:
+            fail_num += 1
+        epid += 1
+    return seed_list, fail_num
+
+def search_seeds_parallel(args, worker_num):
+    '''
+        Seed search on an `EpisodeFarm`.
+            Seeds are handed out in increasing order, and the ledger is the first `episode_num` successful
+            seeds, so the result is the same as the serial search.
+    '''
+    episode_num = args['episode_num']
+    farm = EpisodeFarm(args, worker_num)
+    results = {}
+    next_seed = 0
+    prefix_end, prefix_suc = 0, 0
+    total_suc = 0
+    while prefix_suc < episode_num:
+        # stop feeding once enough successes are known: every seed still needed has been issued already
+        while total_suc < episode_num and farm.pending < 2 * worker_num:
+            farm.submit(('screen', next_seed, next_seed))
+            next_seed += 1
+        job, success = farm.get_result()
+        results[job[2]] = bool(success)
+        total_suc += bool(success)
+        while prefix_end in results and prefix_suc < episode_num:
+            prefix_suc += results[prefix_end]
+            prefix_end += 1
+    farm.close(wait=False)
+
+    seed_list = [seed for seed in range(prefix_end) if results[seed]]
+    fail_num = prefix_end - len(seed_list)
+    return seed_list, fail_num
+
+def run(TASK_ENV, args):
+    worker_num = args.get('worker_num', 1)
     
     print(f"Task name: {args['task_name']}")
 
     if not args['use_seed']:
-        while suc_num < args['episode_num']:
-            try:
-                TASK_ENV.setup_demo(now_ep_num=suc_num, seed = epid, **args)
-                TASK_ENV.play_once()
-
-                if TASK_ENV.plan_success and TASK_ENV.check_success():
-                    print(f"simulate data episode {suc_num} success! (seed = {epid})")
-                    seed_list.append(epid)
-                    suc_num+=1
-                else:
-                    print(f"simulate data episode {suc_num} fail! (seed = {epid})   ")
-                    fail_num +=1
-                
-                TASK_ENV.close()
-                if (args['render_freq']):
-                    TASK_ENV.viewer.close()
-                epid +=1
-            except Exception as e:
-                stack_trace = traceback.format_exc()
-                print(' -------------')
-                print(f"simulate data episode {suc_num} fail! (seed = {epid})   ")
-                print('Error: ', stack_trace)
-                print(' -------------')
-                fail_num +=1
-                TASK_ENV.close()
-                if (args['render_freq']):
-                    TASK_ENV.viewer.close()
-                epid +=1
+        # seed search only needs physics and planning, rendering is left to the collection pass
+        search_args = dict(args, traj_cache_mode='record', render_phase='search')
+        if args.get('screen_mode', False):
+            search_args.update(screen_mode=True, render_freq=0)
+        if worker_num > 1:
+            seed_list, fail_num = search_seeds_parallel(search_args, worker_num)
+        else:
+            seed_list, fail_num = search_seeds(TASK_ENV, search_args)
         
         with open('./task_config/seeds/'+args['task_name']+f'_{args["embodiment_name"]}.txt', 'w') as file:
             for sed in seed_list:
@@ -142,29 +336,61 @@ def run(TASK_ENV, args):
 
         args['render_freq']=0
         args['is_save'] = True
+        args['screen_mode'] = False
+        args['traj_cache_mode'] = 'replay'
+        args['render_phase'] = 'collect'
+
+        info_file_path = args['save_path']+'/scene_info.json'
+        os.makedirs(args['save_path'], exist_ok=True)
 
-        for id in range(args['st_episode'], args['episode_num']):
-            TASK_ENV.setup_demo(now_ep_num=id, seed = seed_list[id],**args)
-            info_file_path = args['save_path']+'/scene_info.json'
-            os.makedirs(args['save_path'], exist_ok=True)
+        # episodes already collected and verified on disk are skipped, so a crashed run resumes where it stopped
+        manifest = EpisodeManifest(args['save_path']+'/manifest.jsonl')
+        episode_list = [id for id in range(args['episode_num']) if not manifest.is_completed(id, seed_list[id])]
+        if len(episode_list) < args['episode_num']:
+            print(f"resume: {args['episode_num'] - len(episode_list)} episodes already collected")
 
-            if not os.path.exists(info_file_path):
-                with open(info_file_path, 'w', encoding='utf-8') as file:
-                    json.dump({}, file, ensure_ascii=False)
+        traj_hit_num, traj_miss_num = 0, 0
 
-            with open(info_file_path, 'r', encoding='utf-8') as file:
-                info_db = json.load(file)
+        def record(id, result):
+            nonlocal traj_hit_num, traj_miss_num
+            if isinstance(result, tuple):
+                if 'traj_cache' in result[1]:
+                    traj_hit_num += result[1]['traj_cache']['hit_num']
+                    traj_miss_num += result[1]['traj_cache']['miss_num']
+                info, meta = result
+                manifest.record_episode(id, seed_list[id], 'success', info=info, **meta)
+                print(f'\nepisode {id} success!')
+            else:
+                manifest.record_episode(id, seed_list[id], 'fail', error=result)
+                print(f'\nepisode {id} failed (seed = {seed_list[id]})')
 
-            info = TASK_ENV.play_once()
-            info_db[f'{id}'] = info
-            with open(info_file_path, 'w', encoding='utf-8') as file:
-                json.dump(info_db, file, ensure_ascii=False)
+        if worker_num > 1:
+            farm = EpisodeFarm(args, worker_num)
+            for id in episode_list:
+                farm.submit(('collect', id, seed_list[id]))
+            while farm.pending > 0:
+                job, result = farm.get_result()
+                record(job[1], result)
+            farm.close()
+        else:
+            for id in episode_list:
+                try:
+                    result = collect_episode(TASK_ENV, args, id, seed_list[id])
+                except Exception as e:
+                    result = traceback.format_exc()
+                    print('Error: ', result)
+                    # close can re-raise a background write error of the episode, it is already a failure
+                    try:
+                        TASK_ENV.close()
+                    except Exception:
+                        print('Error while closing the failed episode: ', traceback.format_exc())
+                record(id, result)
 
-            TASK_ENV.close()
-            print('\nsuccess!')
+        manifest.export_info(info_file_path)
+        if traj_hit_num + traj_miss_num > 0:
+            print(f'\ntrajectory cache hit rate: {traj_hit_num / (traj_hit_num + traj_miss_num):.2%} '
+                  f'({traj_hit_num} / {traj_hit_num + traj_miss_num} plans)')
 
             
 if __name__ == "__main__":
-    from test_render import Sapien_TEST
-    Sapien_TEST()
     main()
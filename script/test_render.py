@@ -7,6 +7,7 @@ current_file_path = os.path.abspath(__file__)
 parent_dir = os.path.dirname(current_file_path)
 
 sys.path.append(os.path.join(parent_dir, '../../tools'))
+sys.path.append(os.path.join(parent_dir, '..'))
 import numpy as np
 import pdb
 import json
@@ -40,13 +41,14 @@ import toppra as ta
 import transforms3d as t3d
 from collections import OrderedDict
 import random
+from envs.utils.render_profile import get_render_profile, apply_render_profile, DEFAULT_RENDER_PROFILE
 
 class Sapien_TEST(gym.Env):
-    def __init__(self):
+    def __init__(self, render_profile = DEFAULT_RENDER_PROFILE):
         super().__init__()
         ta.setup_logging("CRITICAL") # hide logging
 
-        self.setup_scene()
+        self.setup_scene(render_profile=render_profile)
         print('render ok')
         # try: 
         #     self.setup_scene()
@@ -68,14 +70,11 @@ class Sapien_TEST(gym.Env):
         # give renderer to sapien sim
         self.engine.set_renderer(self.renderer)
         
-        sapien.render.set_camera_shader_dir("rt")
-        sapien.render.set_ray_tracing_samples_per_pixel(32)
-        sapien.render.set_ray_tracing_path_depth(8)
-        sapien.render.set_ray_tracing_denoiser("oidn")
+        apply_render_profile(get_render_profile(kwargs.get('render_profile', DEFAULT_RENDER_PROFILE)))
 
         # declare sapien scene
         scene_config = sapien.SceneConfig()
         self.scene = self.engine.create_scene(scene_config)
 
 if __name__ == '__main__':
-    a = Sapien_TEST()
\ No newline at end of file
+    a = Sapien_TEST(*sys.argv[1:2])
\ No newline at end of file